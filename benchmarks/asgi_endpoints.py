@@ -0,0 +1,140 @@
+"""
+Throughput of the hot JSON endpoints under runserver and under serve.py.
+
+Runs the same concurrent load against both projects started with
+start_both_servers.py's runserver setup, then with serve.py's uvicorn
+workers, and reports requests per second and latency per endpoint.
+
+    python -m benchmarks.asgi_endpoints --clients 16 --requests 2000 --workers 4
+"""
+import argparse
+import json
+import os
+import signal
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.common import free_port, setup_django, start_launcher, start_server, summarize
+
+
+def seed(clients, orders):
+    from django.test import Client
+
+    from quickbites.models import MenuItem, Order, User
+    from quickbites.services import order_qr_payload
+
+    item = MenuItem.objects.create(name='Bench Tea', price=10, category='beverages')
+    sessions = []
+    for i in range(clients):
+        user = User.objects.create_user(
+            username=f'ASGI{i:03d}', uprn=f'ASGI{i:03d}', name='Bench User',
+            email=f'asgi{i}@example.com', password='bench'
+        )
+        client = Client(HTTP_HOST='localhost')
+        client.force_login(user)
+        sessions.append(client.cookies['sessionid'].value)
+
+    owner = User.objects.get(username='ASGI000')
+    created = Order.objects.bulk_create([
+        Order(user=owner, total_amount=10, status='confirmed', qr_code='') for _ in range(orders)
+    ])
+    payloads = [order_qr_payload(order.id, owner.uprn) for order in created]
+    return item.id, sessions, payloads
+
+
+def client_sessions(base, session_ids):
+    import requests
+
+    sessions = []
+    for session_id in session_ids:
+        session = requests.Session()
+        session.cookies.set('sessionid', session_id)
+        session.get(f'{base}/menu/')
+        session.headers.update({'X-CSRFToken': session.cookies.get('csrftoken', ''), 'Referer': f'{base}/menu/'})
+        sessions.append(session)
+    return sessions
+
+
+def load(sessions, total, call):
+    """
+    Spread total calls over one thread per session; returns (requests/s, latencies)
+    """
+    per_client = total // len(sessions)
+
+    def run(index):
+        session = sessions[index]
+        samples = []
+        for n in range(per_client):
+            start = time.perf_counter()
+            response = call(session, index * per_client + n)
+            samples.append((time.perf_counter() - start) * 1000)
+            assert response.status_code == 200, (response.status_code, response.text[:300])
+        return samples
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(len(sessions)) as pool:
+        samples = [sample for result in pool.map(run, range(len(sessions))) for sample in result]
+    return round(len(samples) / (time.perf_counter() - start), 1), samples
+
+
+def measure(base, scanner, sessions, item_id, payloads, total):
+    calls = {
+        'get_cart_count': lambda s, i: s.get(f'{base}/get-cart-count/'),
+        'add_to_cart': lambda s, i: s.post(f'{base}/add-to-cart/{item_id}/'),
+        'redeem_ticket': lambda s, i: s.post(f'{base}/api/redeem-ticket/', json={'qr_data': payloads[i]}),
+        'scan_ticket': lambda s, i: s.post(f'{scanner}/scan-ticket/', json={'qr_data': payloads[total + i]}),
+    }
+    results = {}
+    for name, call in calls.items():
+        throughput, samples = load(sessions, total, call)
+        results[name] = {'requests_per_second': throughput, 'latency_ms': summarize(samples)}
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--clients', type=int, default=16, help='Concurrent clients')
+    parser.add_argument('--requests', type=int, default=2000, help='Requests per endpoint per setup')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='serve.py workers per project')
+    args = parser.parse_args()
+
+    # Production SQLite settings (WAL, busy timeout) for both setups, so
+    # concurrent cart writes wait for the lock instead of failing
+    os.environ.setdefault('QUICKBITES_DB_PROFILE', 'tuned')
+    db_path = setup_django('quickbites.settings')
+    total = args.requests - args.requests % args.clients
+    # Each setup redeems a fresh set of tickets through each of the two redeem endpoints
+    item_id, session_ids, payloads = seed(args.clients, total * 4)
+    results = {}
+
+    port, scanner_port = free_port(), free_port()
+    servers = [
+        start_server('quickbites.settings', port, db_path),
+        start_server('scanner_project.settings', scanner_port, db_path),
+    ]
+    try:
+        base, scanner = f'http://127.0.0.1:{port}', f'http://127.0.0.1:{scanner_port}'
+        results['runserver'] = measure(
+            base, scanner, client_sessions(base, session_ids), item_id, payloads[:total * 2], total
+        )
+    finally:
+        for server in servers:
+            server.terminate()
+            server.wait()
+
+    port, scanner_port = free_port(), free_port()
+    launcher = start_launcher(port, scanner_port, db_path, args.workers)
+    try:
+        base, scanner = f'http://127.0.0.1:{port}', f'http://127.0.0.1:{scanner_port}'
+        results[f'serve.py ({args.workers} workers)'] = measure(
+            base, scanner, client_sessions(base, session_ids), item_id, payloads[total * 2:], total
+        )
+    finally:
+        launcher.send_signal(signal.SIGTERM)
+        launcher.wait()
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
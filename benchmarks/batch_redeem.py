@@ -0,0 +1,70 @@
+"""
+Throughput of redeeming a backlog of buffered scans with sequential single
+posts versus the batch endpoint, against the main app over HTTP.
+
+    python -m benchmarks.batch_redeem --scans 200 --batch-size 50
+"""
+import argparse
+import json
+import time
+
+import requests
+
+from benchmarks.common import free_port, setup_django, start_server
+from benchmarks.scan_modes import seed_orders
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--scans', type=int, default=200, help='Size of the scan backlog')
+    parser.add_argument('--batch-size', type=int, default=50, help='Scans per batch request')
+    args = parser.parse_args()
+
+    db_path = setup_django('quickbites.settings')
+    payloads = seed_orders(args.scans * 2)
+    single, batched = payloads[:args.scans], payloads[args.scans:]
+
+    port = free_port()
+    server = start_server('quickbites.settings', port, db_path)
+    session = requests.Session()
+    results = {}
+    try:
+        start = time.perf_counter()
+        for qr_data in single:
+            response = session.post(f'http://127.0.0.1:{port}/api/redeem-ticket/', json={'qr_data': qr_data})
+            assert response.json()['success'], response.json()
+        elapsed = time.perf_counter() - start
+        results['single'] = {
+            'scans': len(single),
+            'requests': len(single),
+            'seconds': round(elapsed, 3),
+            'scans_per_second': round(len(single) / elapsed, 1),
+        }
+
+        start = time.perf_counter()
+        requests_made = 0
+        for i in range(0, len(batched), args.batch_size):
+            scans = [
+                {'qr_data': qr_data, 'scanned_at': int(time.time() * 1000)}
+                for qr_data in batched[i:i + args.batch_size]
+            ]
+            response = session.post(f'http://127.0.0.1:{port}/api/redeem-tickets/', json={'scans': scans})
+            assert all(result['success'] for result in response.json()['results']), response.json()
+            requests_made += 1
+        elapsed = time.perf_counter() - start
+        results['batch'] = {
+            'scans': len(batched),
+            'requests': requests_made,
+            'seconds': round(elapsed, 3),
+            'scans_per_second': round(len(batched) / elapsed, 1),
+        }
+    finally:
+        server.terminate()
+        server.wait()
+
+    results['speedup'] = round(results['batch']['scans_per_second'] / results['single']['scans_per_second'], 1)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
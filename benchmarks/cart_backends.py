@@ -0,0 +1,99 @@
+"""
+Write-lock contention of the cart backends under concurrent add-to-cart load.
+
+Each simulated student runs in its own thread with its own database
+connection and adds items to their cart, as the add-to-cart view does.
+
+    python -m benchmarks.cart_backends --students 50 --adds 20
+"""
+import argparse
+import json
+import threading
+import time
+
+from benchmarks.common import setup_django, summarize
+
+BACKENDS = ['quickbites.cart.DatabaseCart', 'quickbites.cart.CacheCart']
+
+
+def run_backend(backend, users, menu_items, adds):
+    from django.conf import settings
+    from django.db import OperationalError, connection
+
+    from quickbites.cart import get_cart
+
+    settings.CART_BACKEND = backend
+    samples = []
+    lock_errors = 0
+    writes = 0
+    guard = threading.Lock()
+    barrier = threading.Barrier(len(users))
+
+    def count_writes(execute, sql, params, many, context):
+        nonlocal writes
+        if sql.lstrip().split(' ', 1)[0].upper() in ('INSERT', 'UPDATE', 'DELETE'):
+            with guard:
+                writes += 1
+        return execute(sql, params, many, context)
+
+    def student(user):
+        nonlocal lock_errors
+        local_samples = []
+        local_errors = 0
+        with connection.execute_wrapper(count_writes):
+            barrier.wait()
+            for i in range(adds):
+                start = time.perf_counter()
+                try:
+                    get_cart(user).add(menu_items[i % len(menu_items)])
+                except OperationalError:
+                    local_errors += 1
+                local_samples.append((time.perf_counter() - start) * 1000)
+        connection.close()
+        with guard:
+            samples.extend(local_samples)
+            lock_errors += local_errors
+
+    threads = [threading.Thread(target=student, args=(user,)) for user in users]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    return {
+        'operations': len(samples),
+        'lock_errors': lock_errors,
+        'db_writes': writes,
+        'operations_per_second': round(len(samples) / elapsed, 1),
+        'latency_ms': summarize(samples),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--students', type=int, default=50, help='Concurrent students')
+    parser.add_argument('--adds', type=int, default=20, help='Add-to-cart operations per student')
+    args = parser.parse_args()
+
+    setup_django('quickbites.settings')
+
+    from quickbites.models import MenuItem, User
+
+    menu_items = MenuItem.objects.bulk_create([
+        MenuItem(name=f'Item {i}', price=20 + i, category='lunch') for i in range(10)
+    ])
+    results = {}
+    for backend in BACKENDS:
+        users = User.objects.bulk_create([
+            User(uprn=f'{backend[-9:]}{i}', username=f'{backend[-9:]}{i}', name=f'Student {i}')
+            for i in range(args.students)
+        ])
+        results[backend] = run_backend(backend, users, menu_items, args.adds)
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+"""
+Shared helpers for the benchmark scripts.
+
+Benchmarks run against a throwaway SQLite database so they never touch
+db.sqlite3. Run them from the repository root, e.g.
+``python -m benchmarks.scan_modes``.
+"""
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+
+def setup_django(settings_module, db_path=None):
+    """
+    Configure Django against a fresh database and apply migrations.
+    Returns the database path.
+    """
+    if db_path is None:
+        db_path = os.path.join(tempfile.mkdtemp(prefix='quickbites-bench-'), 'db.sqlite3')
+    os.environ['QUICKBITES_DB_PATH'] = str(db_path)
+    os.environ['DJANGO_SETTINGS_MODULE'] = settings_module
+    sys.path.insert(0, str(BASE_DIR))
+
+    import django
+    from django.core.management import call_command
+
+    django.setup()
+    call_command('migrate', verbosity=0)
+    return db_path
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(settings_module, port, db_path, extra_env=None):
+    """
+    Start a development server for a project on the benchmark database
+    and wait until it answers
+    """
+    env = dict(os.environ, QUICKBITES_DB_PATH=str(db_path), DJANGO_SETTINGS_MODULE=settings_module)
+    env.update(extra_env or {})
+    process = subprocess.Popen(
+        [sys.executable, str(BASE_DIR / 'manage.py'), 'runserver', f'127.0.0.1:{port}',
+         '--noreload', f'--settings={settings_module}'],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            urllib.request.urlopen(f'http://127.0.0.1:{port}/', timeout=1)
+            return process
+        except urllib.error.HTTPError:
+            return process
+        except OSError:
+            time.sleep(0.1)
+    process.terminate()
+    raise RuntimeError(f'{settings_module} did not start on port {port}')
+
+
+def wait_until_up(url, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            urllib.request.urlopen(url, timeout=1)
+            return
+        except urllib.error.HTTPError:
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f'{url} did not answer')
+
+
+def start_launcher(port, scanner_port, db_path, workers, scanner_workers=None, extra_env=None):
+    """
+    Start both projects under serve.py on the benchmark database and wait
+    until they answer. Stop it with SIGTERM.
+    """
+    env = dict(os.environ, QUICKBITES_DB_PATH=str(db_path))
+    env.update(extra_env or {})
+    process = subprocess.Popen(
+        [sys.executable, str(BASE_DIR / 'serve.py'), '--host', '127.0.0.1',
+         '--port', str(port), '--scanner-port', str(scanner_port),
+         '--workers', str(workers), '--scanner-workers', str(scanner_workers or workers)],
+        cwd=BASE_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        wait_until_up(f'http://127.0.0.1:{port}/healthz/')
+        wait_until_up(f'http://127.0.0.1:{scanner_port}/healthz/')
+    except RuntimeError:
+        process.terminate()
+        process.wait()
+        raise
+    return process
+
+
+def summarize(samples_ms):
+    """
+    Latency summary in milliseconds
+    """
+    ordered = sorted(samples_ms)
+    if not ordered:
+        return {'count': 0}
+
+    def percentile(p):
+        return round(ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))], 3)
+
+    return {
+        'count': len(ordered),
+        'mean': round(statistics.fmean(ordered), 3),
+        'p50': percentile(50),
+        'p95': percentile(95),
+        'p99': percentile(99),
+        'max': round(ordered[-1], 3),
+    }
@@ -0,0 +1,141 @@
+"""
+Menu latency during a login burst, with and without the CPU pool.
+
+Starts QuickBites under serve.py, then has some clients log in over and
+over, hashing a password each time, while others browse the menu. Runs
+once with password hashing and QR rendering in the request's thread
+(QUICKBITES_CPU_POOL_WORKERS=0) and once in the pool, and reports both
+kinds of request with the pool's task metrics.
+
+    python -m benchmarks.cpu_pool --logins 8 --browsers 4 --seconds 20
+"""
+import argparse
+import json
+import os
+import re
+import signal
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.common import free_port, setup_django, start_launcher, summarize
+
+PASSWORD = 'bench'
+METRICS_TOKEN = 'cpu-pool-bench'
+
+TASK_LINE = re.compile(r'^quickbites_tasks_total\{task="(cpu_pool:[^"]+)",outcome="([^"]+)"\} (\d+)$', re.MULTILINE)
+
+
+def seed(count):
+    from django.contrib.auth.hashers import make_password
+
+    from quickbites.models import MenuItem, User
+
+    for category, label in MenuItem.CATEGORY_CHOICES:
+        MenuItem.objects.bulk_create([
+            MenuItem(name=f'{label} {i}', price=50, category=category) for i in range(10)
+        ])
+    password = make_password(PASSWORD)
+    User.objects.bulk_create([
+        User(username=f'CPU{i:03d}', uprn=f'CPU{i:03d}', name='Bench User',
+             email=f'cpu{i}@example.com', password=password)
+        for i in range(count)
+    ])
+    return [f'CPU{i:03d}' for i in range(count)]
+
+
+def log_in(base, uprn):
+    import requests
+
+    session = requests.Session()
+    session.get(f'{base}/login/')
+    response = session.post(f'{base}/login/', data={
+        'csrfmiddlewaretoken': session.cookies.get('csrftoken', ''), 'uprn': uprn, 'password': PASSWORD,
+    }, headers={'Referer': f'{base}/login/'}, allow_redirects=False)
+    assert response.status_code == 302, response.status_code
+    return session
+
+
+def measure(base, uprns, args):
+    stop = threading.Event()
+    samples = {'login': [], 'menu': []}
+    lock = threading.Lock()
+
+    def record(name, start):
+        with lock:
+            samples[name].append((time.perf_counter() - start) * 1000)
+
+    def login_client(uprn):
+        while not stop.is_set():
+            start = time.perf_counter()
+            log_in(base, uprn)
+            record('login', start)
+
+    def browser(session):
+        while not stop.is_set():
+            start = time.perf_counter()
+            assert session.get(f'{base}/menu/').status_code == 200
+            record('menu', start)
+
+    browsers = [log_in(base, uprn) for uprn in uprns[args.logins:]]
+    with ThreadPoolExecutor(args.logins + args.browsers) as pool:
+        for uprn in uprns[:args.logins]:
+            pool.submit(login_client, uprn)
+        for session in browsers:
+            pool.submit(browser, session)
+        time.sleep(args.seconds)
+        stop.set()
+
+    return {
+        name: {'requests_per_second': round(len(values) / args.seconds, 1), 'latency_ms': summarize(values)}
+        for name, values in samples.items()
+    }
+
+
+def pool_outcomes(base):
+    import requests
+
+    response = requests.get(f'{base}/metrics/', headers={'Authorization': f'Bearer {METRICS_TOKEN}'})
+    outcomes = {}
+    for task, outcome, count in TASK_LINE.findall(response.text):
+        outcomes.setdefault(task, {})[outcome] = int(count)
+    return outcomes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--logins', type=int, default=8, help='Clients logging in repeatedly')
+    parser.add_argument('--browsers', type=int, default=4, help='Clients browsing the menu')
+    parser.add_argument('--seconds', type=float, default=20, help='Length of each run')
+    parser.add_argument('--workers', type=int, default=1, help='serve.py workers')
+    parser.add_argument('--pool-workers', type=int, default=os.cpu_count() or 1, help='CPU pool processes per worker')
+    args = parser.parse_args()
+
+    os.environ.setdefault('QUICKBITES_DB_PROFILE', 'tuned')
+    db_path = setup_django('quickbites.settings')
+    uprns = seed(args.logins + args.browsers)
+
+    from quickbites.metrics import SAVE_DELAY
+
+    results = {}
+    for name, pool_workers in (('in_request_thread', 0), (f'pool_{args.pool_workers}', args.pool_workers)):
+        port, scanner_port = free_port(), free_port()
+        launcher = start_launcher(port, scanner_port, db_path, args.workers, 1, extra_env={
+            'QUICKBITES_CPU_POOL_WORKERS': str(pool_workers),
+            'QUICKBITES_METRICS_TOKEN': METRICS_TOKEN,
+        })
+        base = f'http://127.0.0.1:{port}'
+        try:
+            results[name] = measure(base, uprns, args)
+            # Workers save their metrics a few seconds after they change
+            time.sleep(SAVE_DELAY + 1)
+            results[name]['pool_tasks'] = pool_outcomes(base)
+        finally:
+            launcher.send_signal(signal.SIGTERM)
+            launcher.wait()
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,344 @@
+"""
+Load test of the full student and scanner journeys.
+
+Seeds a campus-sized database: thousands of students, a menu across every
+category and months of past orders. Starts both projects, then simulated
+students log in, open the menu, add items to their cart, pay, open their
+ticket and its QR code, and have the ticket scanned, several at a time.
+
+Reports requests per second, latency percentiles and database queries per
+request for each step as JSON. Query counts are read from each app's
+/metrics/ endpoint, so they are the server's own counts; the login page
+and the login form share a view, and so share a count.
+
+    python -m benchmarks.journeys --clients 20 --journeys 500 --output run.json
+    python -m benchmarks.journeys --baseline run.json   # exits 1 on a regression
+"""
+import argparse
+import json
+import os
+import random
+import re
+import signal
+import sys
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from decimal import Decimal
+
+from benchmarks.common import free_port, setup_django, start_launcher, start_server, summarize
+
+PASSWORD = 'bench'
+METRICS_TOKEN = 'journeys-bench'
+ORDER_EVENTS_TOKEN = 'journeys-bench-events'
+
+# Step: (app, view name in the metrics)
+STEPS = {
+    'login_page': ('quickbites', 'login'),
+    'login': ('quickbites', 'login'),
+    'menu': ('quickbites', 'menu'),
+    'add_to_cart': ('quickbites', 'add_to_cart'),
+    'cart': ('quickbites', 'cart'),
+    'payment': ('quickbites', 'payment'),
+    'process_payment': ('quickbites', 'process_payment'),
+    'payment_success': ('quickbites', 'payment_success'),
+    'ticket': ('quickbites', 'ticket'),
+    'ticket_qr': ('quickbites', 'ticket_qr'),
+    'scan': ('scanner', 'scan_ticket'),
+}
+
+# Per-request query count lines in the metrics text
+QUERY_LINE = re.compile(r'^quickbites_request_db_queries_(sum|count)\{view="([^"]+)"\} (\S+)$', re.MULTILINE)
+
+
+class JourneyFailed(Exception):
+    pass
+
+
+def seed(users, menu_items, history, rng):
+    """
+    Students, menu and past orders. Returns (student UPRNs, available item IDs).
+    """
+    from django.contrib.auth.hashers import make_password
+    from django.utils import timezone
+
+    from quickbites.models import MenuItem, MenuSection, Order, OrderItem, User
+
+    # One hash for every student; hashing thousands would dominate the setup
+    password = make_password(PASSWORD)
+    students = User.objects.bulk_create([
+        User(
+            username=f'JRN{i:05d}', uprn=f'JRN{i:05d}', name=f'Student {i}',
+            email=f'student{i}@example.com', password=password
+        )
+        for i in range(users)
+    ], batch_size=500)
+
+    categories = [value for value, _ in MenuItem.CATEGORY_CHOICES]
+    MenuSection.objects.bulk_create(
+        [MenuSection(name=category) for category in categories], ignore_conflicts=True
+    )
+    items = MenuItem.objects.bulk_create([
+        MenuItem(
+            name=f'{label} {i}', description=f'{label} item {i}',
+            price=Decimal(rng.randrange(10, 250)), category=category,
+            # A few items are off the menu, as on any real day
+            is_available=i % 10 != 9,
+        )
+        for category, label in MenuItem.CATEGORY_CHOICES
+        for i in range(menu_items)
+    ])
+
+    now = timezone.now()
+    orders, order_items = [], []
+    for student in students:
+        for _ in range(history):
+            lines = [(rng.choice(items), rng.randint(1, 3)) for _ in range(rng.randint(1, 4))]
+            order = Order(
+                user=student, total_amount=sum(item.price * quantity for item, quantity in lines),
+                status='completed', is_redeemed=True, qr_code='',
+            )
+            orders.append(order)
+            order_items += [
+                OrderItem(order=order, menu_item=item, quantity=quantity, price=item.price)
+                for item, quantity in lines
+            ]
+    Order.objects.bulk_create(orders, batch_size=500)
+    OrderItem.objects.bulk_create(order_items, batch_size=1000)
+
+    # created_at is set on insert, so the history is spread over the last term afterwards
+    for order in orders:
+        order.created_at = now - timedelta(minutes=rng.randrange(1, 90 * 24 * 60))
+        order.redeemed_at = order.created_at + timedelta(minutes=rng.randrange(5, 30))
+    Order.objects.bulk_update(orders, ['created_at', 'redeemed_at'], batch_size=500)
+
+    return [student.uprn for student in students], [item.id for item in items if item.is_available]
+
+
+def csrf_headers(session, base, referer):
+    return {'X-CSRFToken': session.cookies.get('csrftoken', ''), 'Referer': f'{base}{referer}'}
+
+
+def journey(base, scanner, uprn, item_ids, items_per_cart, rng, record):
+    """
+    One student from login to a scanned ticket. Each step's latency goes to
+    record(step, ms); raises JourneyFailed at the first unexpected response.
+    """
+    import requests
+
+    session = requests.Session()
+
+    def step(name, method, url, expect=200, **kwargs):
+        start = time.perf_counter()
+        response = session.request(method, url, allow_redirects=False, timeout=60, **kwargs)
+        record(name, (time.perf_counter() - start) * 1000)
+        if response.status_code != expect:
+            raise JourneyFailed(f'{name}: {method} {url} -> {response.status_code}')
+        return response
+
+    step('login_page', 'GET', f'{base}/login/')
+    response = step('login', 'POST', f'{base}/login/', expect=302, data={
+        'csrfmiddlewaretoken': session.cookies.get('csrftoken', ''), 'uprn': uprn, 'password': PASSWORD,
+    }, headers={'Referer': f'{base}/login/'})
+    if not response.headers['Location'].endswith('/menu/'):
+        raise JourneyFailed(f'login: redirected to {response.headers["Location"]}')
+
+    step('menu', 'GET', f'{base}/menu/')
+    for item_id in rng.sample(item_ids, items_per_cart):
+        step('add_to_cart', 'POST', f'{base}/add-to-cart/{item_id}/', headers=csrf_headers(session, base, '/menu/'))
+    step('cart', 'GET', f'{base}/cart/')
+    step('payment', 'GET', f'{base}/payment/')
+
+    response = step('process_payment', 'POST', f'{base}/process-payment/', expect=302, data={
+        'csrfmiddlewaretoken': session.cookies.get('csrftoken', ''),
+    }, headers={'Referer': f'{base}/payment/'})
+    match = re.search(r'/payment-success/([0-9a-f-]{36})/$', response.headers['Location'])
+    if not match:
+        raise JourneyFailed(f'process_payment: redirected to {response.headers["Location"]}')
+    order_id = match.group(1)
+
+    step('payment_success', 'GET', f'{base}/payment-success/{order_id}/')
+    step('ticket', 'GET', f'{base}/ticket/{order_id}/')
+    step('ticket_qr', 'GET', f'{base}/ticket/{order_id}/qr.png')
+
+    response = step('scan', 'POST', f'{scanner}/scan-ticket/', json={'qr_data': f'ORDER:{order_id}:{uprn}'})
+    if not response.json().get('success'):
+        raise JourneyFailed(f'scan: {response.json().get("message")}')
+
+
+def scrape_queries(url):
+    """
+    {view: (total queries, requests)} from a metrics endpoint
+    """
+    import requests
+
+    response = requests.get(url, headers={'Authorization': f'Bearer {METRICS_TOKEN}'}, timeout=10)
+    response.raise_for_status()
+    totals = defaultdict(lambda: [0.0, 0.0])
+    for kind, view, value in QUERY_LINE.findall(response.text):
+        totals[view][0 if kind == 'sum' else 1] = float(value)
+    return {view: tuple(values) for view, values in totals.items()}
+
+
+def run(base, scanner, uprns, item_ids, args, metrics_delay):
+    metrics_urls = {'quickbites': f'{base}/metrics/', 'scanner': f'{scanner}/metrics/'}
+    before = {app: scrape_queries(url) for app, url in metrics_urls.items()}
+
+    latencies = defaultdict(list)
+    lock = threading.Lock()
+    failures = []
+
+    def record(name, ms):
+        with lock:
+            latencies[name].append(ms)
+
+    def client(index):
+        rng = random.Random(args.seed + index)
+        for n in range(index, args.journeys, args.clients):
+            try:
+                journey(base, scanner, uprns[n], item_ids, args.items_per_cart, rng, record)
+            except Exception as e:
+                with lock:
+                    failures.append(str(e))
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(args.clients) as pool:
+        list(pool.map(client, range(args.clients)))
+    elapsed = time.perf_counter() - start
+
+    # Workers save their metrics a few seconds after they change
+    time.sleep(metrics_delay)
+    after = {app: scrape_queries(url) for app, url in metrics_urls.items()}
+
+    steps = {}
+    for name, (app, view) in STEPS.items():
+        queries, requests = (
+            a - b for a, b in zip(after[app].get(view, (0, 0)), before[app].get(view, (0, 0)))
+        )
+        steps[name] = {
+            'requests_per_second': round(len(latencies[name]) / elapsed, 1),
+            'latency_ms': summarize(latencies[name]),
+            'queries_per_request': round(queries / requests, 2) if requests else None,
+        }
+    return {
+        'journeys': args.journeys,
+        'completed': args.journeys - len(failures),
+        'journeys_per_second': round((args.journeys - len(failures)) / elapsed, 2),
+        'elapsed_seconds': round(elapsed, 2),
+        'failures': failures[:20],
+        'steps': steps,
+    }
+
+
+def compare(result, baseline, tolerance):
+    """
+    Regressions against a baseline run: slower p95, lower throughput beyond
+    the tolerance, more queries, or journeys that failed
+    """
+    regressions = []
+    if result['completed'] < result['journeys']:
+        regressions.append(f'{result["journeys"] - result["completed"]} journeys failed')
+    for name, step in result['steps'].items():
+        old = baseline['steps'].get(name)
+        if old is None:
+            continue
+        p95, old_p95 = step['latency_ms'].get('p95'), old['latency_ms'].get('p95')
+        if p95 is not None and old_p95 and p95 > old_p95 * (1 + tolerance):
+            regressions.append(f'{name}: p95 {old_p95} -> {p95} ms')
+        if old['requests_per_second'] and step['requests_per_second'] < old['requests_per_second'] * (1 - tolerance):
+            regressions.append(f'{name}: {old["requests_per_second"]} -> {step["requests_per_second"]} requests/s')
+        queries, old_queries = step['queries_per_request'], old['queries_per_request']
+        # Query counts do not vary between runs, so any increase is a regression
+        if queries is not None and old_queries is not None and queries > old_queries + 0.01:
+            regressions.append(f'{name}: {old_queries} -> {queries} queries per request')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--users', type=int, default=3000, help='Students in the seeded database')
+    parser.add_argument('--menu-items', type=int, default=20, help='Menu items per category')
+    parser.add_argument('--history', type=int, default=10, help='Past orders per student')
+    parser.add_argument('--clients', type=int, default=20, help='Concurrent simulated students')
+    parser.add_argument('--journeys', type=int, default=500, help='Journeys to run, one per student')
+    parser.add_argument('--items-per-cart', type=int, default=3)
+    parser.add_argument('--server', choices=('serve', 'runserver'), default='serve')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='serve.py workers per project')
+    parser.add_argument('--seed', type=int, default=1, help='Random seed for the dataset and the journeys')
+    parser.add_argument('--output', help='Also write the results to this JSON file')
+    parser.add_argument('--baseline', help='Results of an earlier run to check for regressions')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='Allowed p95 slowdown and throughput drop against the baseline (default: 25%%)')
+    args = parser.parse_args()
+    if args.journeys > args.users:
+        parser.error('--journeys cannot exceed --users; each journey logs in a different student')
+
+    # Production SQLite settings, so concurrent checkouts wait for the lock instead of failing
+    os.environ.setdefault('QUICKBITES_DB_PROFILE', 'tuned')
+    os.environ['QUICKBITES_METRICS_TOKEN'] = METRICS_TOKEN
+    os.environ['SCANNER_METRICS_TOKEN'] = METRICS_TOKEN
+    # The scanner announces the tickets it redeems to the main app with this
+    os.environ['QUICKBITES_ORDER_EVENTS_TOKEN'] = ORDER_EVENTS_TOKEN
+    os.environ['SCANNER_ORDER_EVENTS_TOKEN'] = ORDER_EVENTS_TOKEN
+    db_path = setup_django('quickbites.settings')
+    rng = random.Random(args.seed)
+    start = time.perf_counter()
+    uprns, item_ids = seed(args.users, args.menu_items, args.history, rng)
+    rng.shuffle(uprns)
+    print(f'Seeded {args.users} students and {args.users * args.history} orders '
+          f'in {time.perf_counter() - start:.1f} s', file=sys.stderr)
+
+    from django.db import connections
+
+    # The servers share the file; leave it unlocked for them
+    connections.close_all()
+
+    port, scanner_port = free_port(), free_port()
+    base, scanner = f'http://127.0.0.1:{port}', f'http://127.0.0.1:{scanner_port}'
+    if args.server == 'serve':
+        from quickbites.metrics import SAVE_DELAY
+
+        servers = [start_launcher(port, scanner_port, db_path, args.workers)]
+        metrics_delay = SAVE_DELAY + 1
+    else:
+        servers = [
+            start_server('quickbites.settings', port, db_path),
+            start_server('scanner_project.settings', scanner_port, db_path, {
+                'SCANNER_REDEEM_URL': f'{base}/api/redeem-ticket/',
+                'SCANNER_ORDER_EVENTS_URL': f'{base}/api/order-events/',
+            }),
+        ]
+        metrics_delay = 0
+
+    try:
+        result = run(base, scanner, uprns, item_ids, args, metrics_delay)
+    finally:
+        for server in servers:
+            server.send_signal(signal.SIGTERM)
+            server.wait()
+
+    result['setup'] = {
+        'server': args.server,
+        'workers': args.workers if args.server == 'serve' else 1,
+        'clients': args.clients,
+        'users': args.users,
+        'orders_per_user': args.history,
+        'menu_items': len(item_ids),
+    }
+    if args.baseline:
+        with open(args.baseline) as f:
+            result['regressions'] = compare(result, json.load(f), args.tolerance)
+
+    output = json.dumps(result, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    if result.get('regressions'):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+"""
+Cost of RequestMetricsMiddleware on get_cart_count.
+
+Sends the same requests through Django's ASGI handler with and without
+the middleware, alternating between the two in rounds so drift in the
+machine's speed affects both equally.
+
+    python -m benchmarks.metrics_overhead --rounds 10 --requests 500
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+
+from benchmarks.common import setup_django
+
+METRICS_MIDDLEWARE = 'quickbites.metrics.RequestMetricsMiddleware'
+
+
+def seed_session():
+    from django.test import Client
+
+    from quickbites.models import User
+
+    user = User.objects.create_user(
+        username='METRICS001', uprn='METRICS001', name='Metrics User',
+        email='metrics@example.com', password='bench'
+    )
+    client = Client(HTTP_HOST='localhost')
+    client.force_login(user)
+    return client.cookies['sessionid'].value
+
+
+async def time_requests(client, count):
+    start = time.perf_counter()
+    for _ in range(count):
+        response = await client.get('/get-cart-count/')
+        assert response.status_code == 200, response.status_code
+    return (time.perf_counter() - start) / count * 1_000_000
+
+
+def make_client(session_id, middleware):
+    from django.test import AsyncClient, override_settings
+
+    with override_settings(MIDDLEWARE=middleware):
+        client = AsyncClient()
+        # The handler loads the middleware when it is created
+        client.handler.load_middleware(is_async=True)
+    client.cookies['sessionid'] = session_id
+    return client
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rounds', type=int, default=10)
+    parser.add_argument('--requests', type=int, default=500, help='Requests per round and setup')
+    args = parser.parse_args()
+
+    setup_django('quickbites.settings')
+
+    from django.conf import settings
+
+    # AsyncClient requests come from 'testserver'
+    settings.ALLOWED_HOSTS = ['testserver']
+    session_id = seed_session()
+    with_metrics = make_client(session_id, settings.MIDDLEWARE)
+    without_metrics = make_client(session_id, [m for m in settings.MIDDLEWARE if m != METRICS_MIDDLEWARE])
+
+    async def run():
+        samples = {'with_metrics': [], 'without_metrics': []}
+        # Warm up caches and the thread pool
+        await time_requests(with_metrics, 50)
+        await time_requests(without_metrics, 50)
+        for _ in range(args.rounds):
+            samples['without_metrics'].append(await time_requests(without_metrics, args.requests))
+            samples['with_metrics'].append(await time_requests(with_metrics, args.requests))
+        return samples
+
+    samples = asyncio.run(run())
+    with_us = statistics.median(samples['with_metrics'])
+    without_us = statistics.median(samples['without_metrics'])
+    print(json.dumps({
+        'requests': args.rounds * args.requests,
+        'without_metrics_us_per_request': round(without_us, 1),
+        'with_metrics_us_per_request': round(with_us, 1),
+        'overhead_percent': round((with_us - without_us) / without_us * 100, 2),
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
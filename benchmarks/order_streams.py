@@ -0,0 +1,160 @@
+"""
+Concurrent ticket status streams on one ASGI server.
+
+Opens one status stream per order against a single uvicorn worker, then
+moves every order to 'ready' and measures how long each stream takes to
+receive the change, along with the server's memory and thread count.
+
+    python -m benchmarks.order_streams --streams 2000
+"""
+import argparse
+import asyncio
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+from benchmarks.common import BASE_DIR, free_port, setup_django, summarize
+
+ORDER_EVENTS_TOKEN = 'order-streams-bench'
+
+
+def seed_orders(count):
+    from django.test import Client
+
+    from quickbites.models import Order, User
+
+    user = User.objects.create_user(
+        username='stream-user', uprn='STREAM001', name='Stream User',
+        email='stream@example.com', password='password'
+    )
+    orders = Order.objects.bulk_create([
+        Order(user=user, total_amount=50, status='confirmed', qr_code='')
+        for _ in range(count)
+    ])
+    client = Client(HTTP_HOST='localhost')
+    client.force_login(user)
+    return [str(order.id) for order in orders], client.cookies['sessionid'].value
+
+
+def server_stats(pid):
+    """
+    (resident memory in MB, thread count) of a process, from /proc
+    """
+    with open(f'/proc/{pid}/status') as f:
+        fields = dict(line.split(':', 1) for line in f)
+    return int(fields['VmRSS'].split()[0]) / 1024, int(fields['Threads'])
+
+
+async def open_stream(port, order_id, session_id):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    writer.write(
+        f'GET /ticket/{order_id}/status/ HTTP/1.1\r\n'
+        f'Host: localhost\r\nCookie: sessionid={session_id}\r\n'
+        'Accept: text/event-stream\r\n\r\n'.encode()
+    )
+    await writer.drain()
+    # Wait for the snapshot event
+    while not (await reader.readline()).startswith(b'data:'):
+        pass
+    return reader, writer
+
+
+async def wait_for_status(reader, status):
+    while True:
+        line = await reader.readline()
+        if not line:
+            raise ConnectionError('stream closed')
+        if line.startswith(b'data:') and json.loads(line[5:])['status'] == status:
+            return time.perf_counter()
+
+
+async def run(port, order_ids, session_id, pid):
+    import requests
+    from asgiref.sync import sync_to_async
+
+    from quickbites.models import Order
+    from quickbites.services import MAX_BATCH_SCANS
+
+    start = time.perf_counter()
+    streams = []
+    # Open in waves so the listen backlog is not overrun
+    for i in range(0, len(order_ids), 200):
+        streams += await asyncio.gather(*[
+            open_stream(port, order_id, session_id) for order_id in order_ids[i:i + 200]
+        ])
+    connect_seconds = time.perf_counter() - start
+
+    await asyncio.sleep(1)
+    rss_mb, threads = server_stats(pid)
+
+    waiters = [
+        asyncio.ensure_future(wait_for_status(reader, 'ready')) for reader, _ in streams
+    ]
+    # Change the orders here and announce them as the scanner does
+    await sync_to_async(Order.objects.filter(id__in=order_ids).update)(status='ready')
+    published = time.perf_counter()
+    for i in range(0, len(order_ids), MAX_BATCH_SCANS):
+        await sync_to_async(requests.post)(
+            f'http://127.0.0.1:{port}/api/order-events/',
+            json={'order_ids': order_ids[i:i + MAX_BATCH_SCANS]},
+            headers={'Authorization': f'Bearer {ORDER_EVENTS_TOKEN}'},
+            timeout=60
+        )
+    received = await asyncio.gather(*waiters)
+
+    for _, writer in streams:
+        writer.close()
+
+    return {
+        'streams': len(streams),
+        'connect_seconds': round(connect_seconds, 2),
+        'server_rss_mb': round(rss_mb, 1),
+        'server_rss_kb_per_stream': round(rss_mb * 1024 / len(streams), 1),
+        'server_threads': threads,
+        'delivery_ms': summarize([(t - published) * 1000 for t in received]),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--streams', type=int, default=2000)
+    args = parser.parse_args()
+
+    # Room for the client's sockets
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (min(hard, max(soft, args.streams * 2 + 256)), hard))
+
+    db_path = setup_django('quickbites.settings')
+    order_ids, session_id = seed_orders(args.streams)
+
+    port = free_port()
+    env = dict(
+        os.environ, QUICKBITES_DB_PATH=str(db_path), DJANGO_SETTINGS_MODULE='quickbites.settings',
+        QUICKBITES_ORDER_EVENTS_TOKEN=ORDER_EVENTS_TOKEN,
+    )
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', 'quickbites.asgi:application',
+         '--port', str(port), '--log-level', 'warning', '--backlog', '4096'],
+        cwd=BASE_DIR, env=env,
+    )
+    try:
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            try:
+                asyncio.run(asyncio.wait_for(asyncio.open_connection('127.0.0.1', port), 1))
+                break
+            except OSError:
+                time.sleep(0.1)
+        result = asyncio.run(run(port, order_ids, session_id, server.pid))
+    finally:
+        server.terminate()
+        server.wait()
+
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == '__main__':
+    main()
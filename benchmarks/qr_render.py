@@ -0,0 +1,227 @@
+"""
+Cost of rendering ticket QR codes, and the size of the pages that show them.
+
+Times the QR render of quickbites.qr across payload lengths, box sizes,
+error-correction levels and image factories (Pillow PNG, pure-Python PNG,
+SVG), with the matrix alone as the floor every format pays. Then renders
+the ticket and payment success pages and compares their size with the
+QR image inlined as base64 against the external image reference they use.
+Last, compares the render cost and bytes of each TICKET_QR_FORMAT.
+
+    python -m benchmarks.qr_render --iterations 200
+"""
+import argparse
+import base64
+import gzip
+import io
+import json
+import re
+import statistics
+import time
+
+from benchmarks.common import setup_django
+
+# A real payload: ORDER:<uuid>:<uprn>
+TICKET_PAYLOAD = 'ORDER:0b8f4a52-7c1e-4d3a-9f61-2a5e8c9d0e17:24CS0123'
+PAYLOAD_LENGTHS = (20, len(TICKET_PAYLOAD), 120, 250)
+BOX_SIZES = (4, 6, 10)
+ERROR_CORRECTION = ('L', 'M', 'Q', 'H')
+
+
+def image_factories():
+    """
+    {name: (factory, save keyword arguments)}; factories whose optional
+    dependency is missing are left out
+    """
+    import qrcode.image.pil
+    import qrcode.image.svg
+
+    factories = {
+        'pil_png': (qrcode.image.pil.PilImage, {'format': 'PNG'}),
+        'svg': (qrcode.image.svg.SvgImage, {}),
+        'svg_path': (qrcode.image.svg.SvgPathImage, {}),
+    }
+    try:
+        import png  # noqa: F401 -- pypng, needed by the pure-Python factory
+        import qrcode.image.pure
+    except ImportError:
+        pass
+    else:
+        factories['pure_png'] = (qrcode.image.pure.PyPNGImage, {})
+    return factories
+
+
+def time_call(func, iterations, repeat=5):
+    """
+    Median microseconds per call over repeat rounds of iterations calls
+    """
+    rounds = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(iterations):
+            func()
+        rounds.append((time.perf_counter() - start) / iterations * 1_000_000)
+    return round(statistics.median(rounds), 1)
+
+
+def render(data, box_size, error_correction, factory=None, save_kwargs=None):
+    """
+    Render as quickbites.qr does, returning the image bytes, or the module
+    matrix when factory is None
+    """
+    import qrcode
+    import qrcode.constants
+
+    from quickbites.qr import QR_BORDER, QR_VERSION
+
+    qr = qrcode.QRCode(
+        version=QR_VERSION, box_size=box_size, border=QR_BORDER,
+        error_correction=getattr(qrcode.constants, f'ERROR_CORRECT_{error_correction}'),
+    )
+    qr.add_data(data)
+    qr.make(fit=True)
+    if factory is None:
+        return qr.get_matrix()
+    buffer = io.BytesIO()
+    qr.make_image(image_factory=factory).save(buffer, **save_kwargs)
+    return buffer.getvalue()
+
+
+def payload(length):
+    return (TICKET_PAYLOAD * (length // len(TICKET_PAYLOAD) + 1))[:length]
+
+
+def measure_renders(iterations):
+    from quickbites.qr import QR_BOX_SIZE
+
+    factories = image_factories()
+    results = []
+
+    def add(axis, data, box_size, error_correction, name):
+        factory, save_kwargs = factories[name] if name != 'matrix' else (None, None)
+        output = render(data, box_size, error_correction, factory, save_kwargs)
+        results.append({
+            'varying': axis,
+            'payload_length': len(data),
+            'box_size': box_size,
+            'error_correction': error_correction,
+            'format': name,
+            'us_per_render': time_call(
+                lambda: render(data, box_size, error_correction, factory, save_kwargs), iterations
+            ),
+            'bytes': None if factory is None else len(output),
+            'base64_bytes': None if factory is None else len(base64.b64encode(output)),
+        })
+
+    # Each axis varies on its own from the current ticket settings
+    for length in PAYLOAD_LENGTHS:
+        add('payload_length', payload(length), QR_BOX_SIZE, 'M', 'pil_png')
+    for box_size in BOX_SIZES:
+        add('box_size', TICKET_PAYLOAD, box_size, 'M', 'pil_png')
+    for level in ERROR_CORRECTION:
+        add('error_correction', TICKET_PAYLOAD, QR_BOX_SIZE, level, 'pil_png')
+    for name in ('matrix', *factories):
+        add('format', TICKET_PAYLOAD, QR_BOX_SIZE, 'M', name)
+    return results
+
+
+def seed_ticket():
+    """
+    A logged in client and a three-item order
+    """
+    from django.conf import settings
+    from django.test import Client
+
+    from quickbites.models import MenuItem, Order, OrderItem, User
+    from quickbites.services import order_qr_payload
+
+    settings.ALLOWED_HOSTS = ['testserver']
+    user = User.objects.create_user(
+        username='QRBENCH01', uprn='QRBENCH01', name='QR Bench', email='qr@example.com', password='bench'
+    )
+    order = Order.objects.create(user=user, total_amount=120, status='confirmed')
+    order.qr_code = order_qr_payload(order.id, user.uprn)
+    order.save(update_fields=['qr_code'])
+    for i in range(3):
+        item = MenuItem.objects.create(name=f'Bench Item {i}', price=40, category='lunch')
+        OrderItem.objects.create(order=order, menu_item=item, quantity=1, price=40)
+
+    client = Client()
+    client.force_login(user)
+    return client, order
+
+
+def sizes(body):
+    return {'bytes': len(body), 'gzip_bytes': len(gzip.compress(body))}
+
+
+def page_sizes(client, order):
+    """
+    Size of the ticket and payment success pages with the QR image inlined
+    as base64 and as the external reference they use now
+    """
+    from quickbites.qr import generate_qr_code
+
+    image = client.get(f'/ticket/{order.id}/qr.png').content
+    data_uri = f'data:image/png;base64,{generate_qr_code(order.qr_code)}'
+
+    results = {}
+    for name, url in (('ticket', f'/ticket/{order.id}/'), ('payment_success', f'/payment-success/{order.id}/')):
+        response = client.get(url)
+        assert response.status_code == 200, (url, response.status_code)
+        page = response.content
+        src = re.compile(rf'src="[^"]*/ticket/{order.id}/qr\.png"'.encode())
+        if not src.search(page):
+            results[name] = {'external': sizes(page), 'note': 'page shows no QR image'}
+            continue
+        inline = src.sub(f'src="{data_uri}"'.encode(), page)
+        external = sizes(page)
+        # The browser fetches the image separately, and caches it
+        external['image_bytes'] = len(image)
+        results[name] = {'inline_base64': sizes(inline), 'external': external}
+    return results
+
+
+def ticket_formats(client, order, iterations):
+    """
+    Render time and size of each TICKET_QR_FORMAT, with the size of the
+    ticket page that shows it and of the image the browser then fetches
+    (none for the matrix, which is sent inside the page)
+    """
+    from django.conf import settings
+
+    from quickbites.qr import QR_FORMATS, RENDERERS
+
+    results = {}
+    for name, renderer in RENDERERS.items():
+        output = renderer(order.qr_code)
+        settings.TICKET_QR_FORMAT = name
+        page = client.get(f'/ticket/{order.id}/').content
+        image_url = re.search(rf'src="([^"]*/ticket/{order.id}/qr\.[a-z]+)"'.encode(), page)
+        image = client.get(image_url.group(1).decode()).content if image_url else b''
+        results[name] = {
+            'content_type': QR_FORMATS[name][1],
+            'us_per_render': time_call(lambda: renderer(order.qr_code), iterations),
+            'image': sizes(output),
+            'ticket_page': sizes(page),
+            'image_request_bytes': len(image),
+        }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=200, help='Renders per timing round')
+    args = parser.parse_args()
+
+    setup_django('quickbites.settings')
+    client, order = seed_ticket()
+    print(json.dumps({
+        'renders': measure_renders(args.iterations),
+        'pages': page_sizes(client, order),
+        'ticket_formats': ticket_formats(client, order, args.iterations),
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
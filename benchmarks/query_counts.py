@@ -0,0 +1,165 @@
+"""
+Query counts of the pages that walk relations, at several cart and order
+sizes.
+
+Each page is rendered through the test client with the cart, order or
+changelist holding 1, 5 and 25 rows, and its query count is compared with
+the budget pinned in QUERY_BUDGETS. A page whose count grows with its size
+has an N+1; the script exits non-zero if any page misses its budget.
+
+    python -m benchmarks.query_counts
+"""
+import argparse
+import json
+import sys
+
+from benchmarks.common import setup_django
+
+SIZES = [1, 5, 25]
+
+# Queries per page, independent of size. Session and user lookups included.
+QUERY_BUDGETS = {
+    'cart (database)': 3,
+    'cart (cache)': 3,
+    'payment (database)': 3,
+    'payment (cache)': 3,
+    'payment success': 3,
+    'ticket': 4,
+    'profile': 4,
+    'admin order changelist': 5,
+    'admin order change form': 6,
+    'admin feedback changelist': 5,
+    'admin cart changelist': 5,
+    'admin cart item changelist': 5,
+}
+
+
+def seed(size):
+    """
+    Create a student with a cart of `size` lines, `size` orders of `size`
+    lines each and `size` feedback messages, and a staff user.
+    Returns (student, staff user, first order).
+    """
+    from django.core.cache import cache
+
+    from quickbites.models import Cart, CartItem, Feedback, MenuItem, Order, OrderItem, User
+    from quickbites.cart import CacheCart
+
+    student = User.objects.create_user(
+        username=f'student-{size}', uprn=f'S{size}', name=f'Student {size}',
+        email=f'student{size}@example.com', password='password'
+    )
+    staff = User.objects.create_superuser(
+        username=f'staff-{size}', uprn=f'A{size}', name=f'Staff {size}',
+        email=f'staff{size}@example.com', password='password'
+    )
+    menu_items = MenuItem.objects.bulk_create([
+        MenuItem(name=f'Item {size}-{i}', price=10 + i, category='snacks')
+        for i in range(size)
+    ])
+
+    cart = Cart.objects.create(user=student)
+    CartItem.objects.bulk_create([
+        CartItem(cart=cart, menu_item=menu_item, quantity=2) for menu_item in menu_items
+    ])
+    cache.set(
+        CacheCart.key_template.format(user_id=student.pk),
+        {menu_item.id: 2 for menu_item in menu_items}
+    )
+
+    orders = []
+    for _ in range(size):
+        order = Order.objects.create(user=student, total_amount=0, status='confirmed', qr_code='')
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, menu_item=menu_item, quantity=1, price=menu_item.price)
+            for menu_item in menu_items
+        ])
+        orders.append(order)
+
+    Feedback.objects.bulk_create([
+        Feedback(user=student, subject=f'Feedback {i}', message='Great food')
+        for i in range(size)
+    ])
+    return student, staff, orders[0]
+
+
+def count_queries(client, url):
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    with CaptureQueriesContext(connection) as queries:
+        response = client.get(url)
+    if response.status_code != 200:
+        raise RuntimeError(f'GET {url} returned {response.status_code}')
+    return len(queries)
+
+
+def measure(size):
+    from django.conf import settings
+    from django.test import Client
+    from django.urls import reverse
+
+    student, staff, order = seed(size)
+
+    student_client = Client(HTTP_HOST='localhost')
+    student_client.force_login(student)
+    staff_client = Client(HTTP_HOST='localhost')
+    staff_client.force_login(staff)
+
+    counts = {}
+    for backend, label in [('quickbites.cart.DatabaseCart', 'database'), ('quickbites.cart.CacheCart', 'cache')]:
+        settings.CART_BACKEND = backend
+        counts[f'cart ({label})'] = count_queries(student_client, reverse('cart'))
+        counts[f'payment ({label})'] = count_queries(student_client, reverse('payment'))
+
+    counts['payment success'] = count_queries(student_client, reverse('payment_success', args=[order.id]))
+    counts['ticket'] = count_queries(student_client, reverse('ticket', args=[order.id]))
+    counts['profile'] = count_queries(student_client, reverse('profile'))
+
+    pages = {
+        'admin order changelist': reverse('admin:quickbites_order_changelist'),
+        'admin order change form': reverse('admin:quickbites_order_change', args=[order.id]),
+        'admin feedback changelist': reverse('admin:quickbites_feedback_changelist'),
+        'admin cart changelist': reverse('admin:quickbites_cart_changelist'),
+        'admin cart item changelist': reverse('admin:quickbites_cartitem_changelist'),
+    }
+    for name, url in pages.items():
+        counts[name] = count_queries(staff_client, url)
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=SIZES)
+    args = parser.parse_args()
+
+    setup_django('quickbites.settings')
+
+    from django.db import transaction
+
+    # Warm the per-process caches (content types, menu snapshot) first
+    with transaction.atomic():
+        measure(1)
+        transaction.set_rollback(True)
+
+    results = {}
+    for size in args.sizes:
+        # Each size starts from an empty database
+        with transaction.atomic():
+            results[size] = measure(size)
+            transaction.set_rollback(True)
+
+    failures = [
+        f'{page}: {results[size][page]} queries with {size} rows (budget {budget})'
+        for page, budget in QUERY_BUDGETS.items()
+        for size in args.sizes
+        if results[size][page] != budget
+    ]
+    print(json.dumps(results, indent=2))
+    for failure in failures:
+        print(f'[query budget] {failure}', file=sys.stderr)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
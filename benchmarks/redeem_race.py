@@ -0,0 +1,98 @@
+"""
+Concurrency check for ticket redemption under both SQLite profiles.
+
+For each ticket, a number of threads, each with its own database
+connection, call services.redeem_ticket on the same QR payload at once, as
+scanners presenting the same ticket together do. Exactly one of them must
+succeed. Each profile runs in its own process on a fresh database; the
+script exits non-zero if any ticket was redeemed more or less than once.
+
+    python -m benchmarks.redeem_race --threads 20 --tickets 10
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import threading
+
+from benchmarks.common import BASE_DIR, setup_django
+
+
+def run_profile(threads, tickets):
+    from django.db import OperationalError, connection
+
+    from quickbites import services
+    from quickbites.models import Order, User
+
+    user = User.objects.create(uprn='RACE0001', username='RACE0001', name='Race Student')
+    results = []
+    for _ in range(tickets):
+        order = Order.objects.create(user=user, total_amount=50, status='ready')
+        qr_data = services.order_qr_payload(order.id, user.uprn)
+        outcomes = {'redeemed': 0, 'refused': 0, 'lock_errors': 0}
+        guard = threading.Lock()
+        barrier = threading.Barrier(threads)
+
+        def scanner():
+            barrier.wait()
+            try:
+                outcome = 'redeemed' if services.redeem_ticket(qr_data)['success'] else 'refused'
+            except OperationalError:
+                outcome = 'lock_errors'
+            finally:
+                connection.close()
+            with guard:
+                outcomes[outcome] += 1
+
+        workers = [threading.Thread(target=scanner) for _ in range(threads)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        outcomes['stored_as_redeemed'] = Order.objects.filter(id=order.id, is_redeemed=True).exists()
+        results.append(outcomes)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--threads', type=int, default=20, help='Scanners per ticket')
+    parser.add_argument('--tickets', type=int, default=10, help='Tickets raced per profile')
+    parser.add_argument('--profile', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.profile:
+        # Worker: the profile is read from the environment by the settings
+        setup_django('quickbites.settings')
+        print(json.dumps(run_profile(args.threads, args.tickets)))
+        return
+
+    results = {}
+    for profile in ('default', 'tuned'):
+        output = subprocess.run(
+            [sys.executable, '-m', 'benchmarks.redeem_race', '--profile', profile,
+             '--threads', str(args.threads), '--tickets', str(args.tickets)],
+            env=dict(os.environ, QUICKBITES_DB_PROFILE=profile),
+            cwd=BASE_DIR,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout
+        results[profile] = json.loads(output.strip().splitlines()[-1])
+
+    failures = [
+        f'{profile}: ticket {i} redeemed {outcomes["redeemed"]} times '
+        f'(stored as redeemed: {outcomes["stored_as_redeemed"]})'
+        for profile, tickets in results.items()
+        for i, outcomes in enumerate(tickets)
+        if outcomes['redeemed'] != 1 or not outcomes['stored_as_redeemed']
+    ]
+    print(json.dumps(results, indent=2))
+    for failure in failures:
+        print(f'[redeem race] {failure}', file=sys.stderr)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
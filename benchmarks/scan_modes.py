@@ -0,0 +1,65 @@
+"""
+Compare per-scan latency of the scanner's 'direct' and 'http' redeem modes.
+
+    python -m benchmarks.scan_modes --scans 200
+"""
+import argparse
+import json
+import time
+
+from benchmarks.common import free_port, setup_django, start_server, summarize
+
+
+def seed_orders(count):
+    from quickbites.models import Order, User
+    from quickbites.services import order_qr_payload
+
+    user = User.objects.create_user('BENCH001', 'Bench User', password='bench', username='BENCH001')
+    orders = Order.objects.bulk_create([
+        Order(user=user, total_amount=50, status='confirmed') for _ in range(count)
+    ])
+    return [order_qr_payload(order.id, user.uprn) for order in orders]
+
+
+def run_scans(client, payloads):
+    samples = []
+    for qr_data in payloads:
+        start = time.perf_counter()
+        response = client.post('/scan-ticket/', {'qr_data': qr_data}, content_type='application/json')
+        samples.append((time.perf_counter() - start) * 1000)
+        assert response.json()['success'], response.json()
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--scans', type=int, default=200, help='Scans per mode')
+    args = parser.parse_args()
+
+    db_path = setup_django('scanner_project.settings')
+
+    from django.conf import settings
+    from django.test import Client
+
+    payloads = seed_orders(args.scans * 2)
+    client = Client(HTTP_HOST='localhost')
+    results = {}
+
+    settings.SCANNER_REDEEM_MODE = 'direct'
+    results['direct'] = summarize(run_scans(client, payloads[:args.scans]))
+
+    port = free_port()
+    server = start_server('quickbites.settings', port, db_path)
+    try:
+        settings.SCANNER_REDEEM_MODE = 'http'
+        settings.SCANNER_REDEEM_URL = f'http://127.0.0.1:{port}/api/redeem-ticket/'
+        results['http'] = summarize(run_scans(client, payloads[args.scans:]))
+    finally:
+        server.terminate()
+        server.wait()
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
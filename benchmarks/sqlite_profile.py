@@ -0,0 +1,116 @@
+"""
+Rush-hour load test comparing the 'default' and 'tuned' SQLite profiles.
+
+Concurrent students add items to their carts, check out, and have their
+tickets redeemed, all against one SQLite file. Each profile runs in its own
+process on a fresh database; the report gives the "database is locked" error
+rate and latency percentiles per operation.
+
+    python -m benchmarks.sqlite_profile --students 40 --rounds 5
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+
+from benchmarks.common import BASE_DIR, setup_django, summarize
+
+
+def run_profile(students, rounds):
+    from django.db import OperationalError, connection
+
+    from quickbites import services
+    from quickbites.models import MenuItem, User
+
+    menu_items = MenuItem.objects.bulk_create([
+        MenuItem(name=f'Item {i}', price=20 + i, category='lunch') for i in range(10)
+    ])
+    users = User.objects.bulk_create([
+        User(uprn=f'S{i:05d}', username=f'S{i:05d}', name=f'Student {i}') for i in range(students)
+    ])
+
+    samples = {'add_to_cart': [], 'checkout': [], 'redeem': []}
+    errors = {name: 0 for name in samples}
+    guard = threading.Lock()
+    barrier = threading.Barrier(students)
+
+    def timed(name, func, *args):
+        start = time.perf_counter()
+        try:
+            result = func(*args)
+        except OperationalError:
+            result = None
+            with guard:
+                errors[name] += 1
+        except services.EmptyCartError:
+            # Both adds failed, so there was nothing to check out
+            result = None
+        with guard:
+            samples[name].append((time.perf_counter() - start) * 1000)
+        return result
+
+    def student(user):
+        barrier.wait()
+        for i in range(rounds):
+            timed('add_to_cart', services.add_cart_item, user, menu_items[i % len(menu_items)])
+            timed('add_to_cart', services.add_cart_item, user, menu_items[(i + 1) % len(menu_items)])
+            order = timed('checkout', services.place_order, user)
+            if order is not None:
+                timed('redeem', services.redeem_ticket, services.order_qr_payload(order.id, user.uprn))
+        connection.close()
+
+    threads = [threading.Thread(target=student, args=(user,)) for user in users]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    return {
+        'seconds': round(elapsed, 3),
+        'operations': {
+            name: {
+                'lock_errors': errors[name],
+                'lock_error_rate': round(errors[name] / len(samples[name]), 4) if samples[name] else 0,
+                'latency_ms': summarize(samples[name]),
+            }
+            for name in samples
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--students', type=int, default=40, help='Concurrent students')
+    parser.add_argument('--rounds', type=int, default=5, help='Orders placed per student')
+    parser.add_argument('--profile', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.profile:
+        # Worker: the profile is read from the environment by the settings
+        setup_django('quickbites.settings')
+        print(json.dumps(run_profile(args.students, args.rounds)))
+        return
+
+    results = {}
+    for profile in ('default', 'tuned'):
+        output = subprocess.run(
+            [sys.executable, '-m', 'benchmarks.sqlite_profile', '--profile', profile,
+             '--students', str(args.students), '--rounds', str(args.rounds)],
+            env=dict(os.environ, QUICKBITES_DB_PROFILE=profile),
+            cwd=BASE_DIR,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout
+        results[profile] = json.loads(output.strip().splitlines()[-1])
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
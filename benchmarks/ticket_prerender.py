@@ -0,0 +1,95 @@
+"""
+First view of a new ticket's QR image, with and without pre-rendering.
+
+Each student checks out, waits a moment as a real student does before
+opening the ticket, then loads the QR image. With pre-rendering the image
+should already be cached when it is requested; checkout latency should be
+the same both ways, as it does no image work in either.
+
+    python -m benchmarks.ticket_prerender --orders 200 --think-ms 200
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+from benchmarks.common import setup_django, summarize
+
+
+def seed(count):
+    from django.test import Client
+
+    from quickbites.models import MenuItem, User
+
+    item = MenuItem.objects.create(name='Bench Thali', price=80, category='lunch')
+    clients = []
+    for i in range(count):
+        user = User.objects.create_user(
+            username=f'PRE{i:04d}', uprn=f'PRE{i:04d}', name='Bench User',
+            email=f'pre{i}@example.com', password='bench'
+        )
+        client = Client()
+        client.force_login(user)
+        clients.append(client)
+    return item, clients
+
+
+def run(item, clients, think_ms):
+    checkout, first_view = [], []
+    for client in clients:
+        assert client.post(f'/add-to-cart/{item.id}/').status_code == 200
+
+        start = time.perf_counter()
+        response = client.post('/process-payment/')
+        checkout.append((time.perf_counter() - start) * 1000)
+        assert response.status_code == 302, response.status_code
+        order_id = response['Location'].rstrip('/').rsplit('/', 1)[-1]
+
+        time.sleep(think_ms / 1000)
+        start = time.perf_counter()
+        response = client.get(f'/ticket/{order_id}/qr.png')
+        first_view.append((time.perf_counter() - start) * 1000)
+        assert response.status_code == 200, response.status_code
+    return {'checkout_ms': summarize(checkout), 'first_qr_view_ms': summarize(first_view)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--orders', type=int, default=200, help='Orders per setup')
+    parser.add_argument('--think-ms', type=float, default=200, help='Pause between checkout and opening the ticket')
+    args = parser.parse_args()
+
+    os.environ['QUICKBITES_QR_CACHE_DIR'] = tempfile.mkdtemp(prefix='quickbites-bench-qr-')
+    setup_django('quickbites.settings')
+
+    from django.conf import settings
+    from django.db.models.signals import post_save
+
+    from quickbites.metrics import registry
+    from quickbites.models import Order
+    from quickbites.ticket_prerender import TASK, prerender_new_ticket, prerenderer
+
+    settings.ALLOWED_HOSTS = ['testserver']
+    item, clients = seed(args.orders * 2)
+    results = {}
+
+    post_save.disconnect(prerender_new_ticket, sender=Order)
+    results['on_demand'] = run(item, clients[:args.orders], args.think_ms)
+
+    post_save.connect(prerender_new_ticket, sender=Order)
+    results['prerendered'] = run(item, clients[args.orders:], args.think_ms)
+    prerenderer.join()
+
+    task = registry.collect()[1][TASK]
+    results['prerendered']['queue'] = {
+        'outcomes': task.outcomes,
+        'wait_ms_p50': round(task.histograms['quickbites_task_wait_seconds'].quantile(0.5) * 1000, 2),
+        'wait_ms_p95': round(task.histograms['quickbites_task_wait_seconds'].quantile(0.95) * 1000, 2),
+        'render_ms_p50': round(task.histograms['quickbites_task_duration_seconds'].quantile(0.5) * 1000, 2),
+    }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
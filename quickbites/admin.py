@@ -1,6 +1,7 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
 from .models import User, MenuItem, Cart, CartItem, Order, OrderItem, Feedback, MenuSection
+from .services import recalculate_cart_totals
 
 class CustomUserAdmin(UserAdmin):
     """
@@ -77,6 +78,11 @@ class OrderAdmin(admin.ModelAdmin):
             'fields': ('is_redeemed', 'redeemed_at', 'qr_code')
         }),
     )
+    
+    def get_queryset(self, request):
+        # Legacy rows may still hold a base64 PNG; only the change form needs it.
+        # Order.__str__ reads the user's name, so load users in the same query.
+        return super().get_queryset(request).defer('qr_code').select_related('user')
 
 @admin.register(Feedback)
 class FeedbackAdmin(admin.ModelAdmin):
@@ -87,6 +93,7 @@ class FeedbackAdmin(admin.ModelAdmin):
     list_filter = ('rating', 'is_read', 'created_at')
     search_fields = ('user__name', 'subject', 'message')
     list_editable = ('is_read',)
+    list_select_related = ('user',)
     readonly_fields = ('user', 'created_at')
     ordering = ('-created_at',)
     
@@ -103,6 +110,9 @@ class OrderItemInline(admin.TabularInline):
     model = OrderItem
     readonly_fields = ('menu_item', 'quantity', 'price')
     extra = 0
+    
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('menu_item')
 
 # Update OrderAdmin to include OrderItems
 OrderAdmin.inlines = [OrderItemInline]
@@ -110,6 +120,43 @@ OrderAdmin.inlines = [OrderItemInline]
 # Register the custom user admin
 admin.site.register(User, CustomUserAdmin)
 
-# Register other models with basic admin
-admin.site.register(Cart)
-admin.site.register(CartItem)
+@admin.register(Cart)
+class CartAdmin(admin.ModelAdmin):
+    """
+    Admin interface for viewing carts
+    """
+    list_display = ('id', 'user', 'item_count', 'total_amount', 'updated_at')
+    list_select_related = ('user',)
+    search_fields = ('user__name', 'user__uprn')
+    # Derived from the cart's items, which keep them up to date
+    readonly_fields = ('item_count', 'total_amount')
+    ordering = ('-updated_at',)
+
+@admin.register(CartItem)
+class CartItemAdmin(admin.ModelAdmin):
+    """
+    Admin interface for viewing cart items
+    """
+    list_display = ('id', 'cart_user', 'menu_item', 'quantity')
+    list_select_related = ('cart__user', 'menu_item')
+    search_fields = ('cart__user__name', 'cart__user__uprn', 'menu_item__name')
+    
+    @admin.display(description='User', ordering='cart__user__name')
+    def cart_user(self, obj):
+        return obj.cart.user
+    
+    # Edits here bypass the cart services, so recount the carts they touch
+    def save_model(self, request, obj, form, change):
+        cart_ids = {obj.cart_id, form.initial.get('cart')} - {None}
+        super().save_model(request, obj, form, change)
+        recalculate_cart_totals(Cart.objects.filter(pk__in=cart_ids))
+    
+    def delete_model(self, request, obj):
+        cart_id = obj.cart_id
+        super().delete_model(request, obj)
+        recalculate_cart_totals(Cart.objects.filter(pk=cart_id))
+    
+    def delete_queryset(self, request, queryset):
+        cart_ids = list(queryset.values_list('cart_id', flat=True).distinct())
+        super().delete_queryset(request, queryset)
+        recalculate_cart_totals(Cart.objects.filter(pk__in=cart_ids))
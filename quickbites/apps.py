@@ -0,0 +1,28 @@
+from django.apps import AppConfig
+from django.conf import settings
+
+
+class QuickbitesConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'quickbites'
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+
+        from . import signals  # noqa: F401
+        from .metrics import install_query_timer
+
+        connection_created.connect(install_query_timer)
+
+        if settings.QUERY_INSPECTOR:
+            from .query_inspector import install_query_recorder
+
+            connection_created.connect(install_query_recorder)
+
+        if settings.QR_PRERENDER:
+            from django.db.models.signals import post_save
+
+            from .models import Order
+            from .ticket_prerender import prerender_new_ticket
+
+            post_save.connect(prerender_new_ticket, sender=Order)
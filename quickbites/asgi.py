@@ -0,0 +1,24 @@
+"""
+ASGI config for the quickbites project.
+
+It exposes the ASGI callable as a module-level variable named ``application``.
+The live order streams need an ASGI server, e.g.
+``uvicorn quickbites.asgi:application``; they are answered by
+EventStreamApp in front of Django's handler.
+
+For more information on this file, see
+https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
+"""
+
+import os
+
+from django.core.asgi import get_asgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'quickbites.settings')
+
+django_application = get_asgi_application()
+
+# Imported after Django is set up
+from quickbites.streaming import EventStreamApp  # noqa: E402
+
+application = EventStreamApp(django_application)
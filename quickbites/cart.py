@@ -0,0 +1,223 @@
+"""
+Pluggable cart storage.
+
+The cart views talk to a cart backend chosen by the CART_BACKEND setting:
+
+- ``DatabaseCart`` keeps carts in the Cart and CartItem tables.
+- ``CacheCart`` keeps carts in the Django cache, keyed by user, and only
+  touches the database to look up menu items and at checkout. With SQLite
+  serialising writers, this keeps browsing and cart edits off the write lock.
+
+Both expose cart lines as CartItem instances (unsaved for CacheCart) so the
+templates work unchanged, and raise CartItem.DoesNotExist for unknown lines.
+The hot add and count operations also have async versions for async views.
+"""
+import asyncio
+import time
+import uuid
+from contextlib import asynccontextmanager, contextmanager
+from decimal import Decimal
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+from . import services
+from .models import Cart, CartItem, MenuItem
+from .services import EmptyCartError
+
+
+def get_cart(user):
+    """
+    Return the configured cart backend for a user
+    """
+    return import_string(settings.CART_BACKEND)(user)
+
+
+class DatabaseCart:
+    """
+    Cart stored in the Cart and CartItem tables
+    """
+
+    def __init__(self, user):
+        self.user = user
+
+    def add(self, menu_item):
+        return services.add_cart_item(self.user, menu_item).item_count
+
+    async def aadd(self, menu_item):
+        # The add runs in a transaction, which the async ORM cannot open
+        return await sync_to_async(self.add)(menu_item)
+
+    def set_quantity(self, line_id, quantity):
+        """
+        Returns (cart total, cart count, line subtotal)
+        """
+        cart, subtotal = services.set_cart_item_quantity(self.user, line_id, quantity)
+        return cart.total_amount, cart.item_count, subtotal
+
+    def remove(self, line_id):
+        """
+        Returns (cart total, cart count)
+        """
+        cart = services.remove_cart_item(self.user, line_id)
+        return cart.total_amount, cart.item_count
+
+    def count(self):
+        return Cart.objects.filter(user=self.user).values_list('item_count', flat=True).first() or 0
+
+    async def acount(self):
+        return await Cart.objects.filter(user=self.user).values_list('item_count', flat=True).afirst() or 0
+
+    def lines(self):
+        return list(
+            CartItem.objects.filter(cart__user=self.user)
+            .select_related('menu_item')
+            .order_by('pk')
+        )
+
+    def checkout(self):
+        return services.place_order(self.user)
+
+
+class CacheCart:
+    """
+    Cart stored in the Django cache as an ordered {menu item id: quantity}
+    mapping. Line ids are menu item ids.
+
+    Each change reads and rewrites the whole mapping under a per-cart lock
+    taken with cache.add(), so two requests for the same cart cannot lose
+    each other's changes. When running more than one process, use a cache
+    shared by all workers whose add() is atomic (Memcached, Redis, database);
+    the file-based cache's is not.
+    """
+
+    key_template = 'quickbites:cart:{user_id}'
+    lock_key_template = 'quickbites:cart-lock:{user_id}'
+    # Seconds a lock outlives a holder that died without releasing it
+    lock_timeout = 5
+    lock_poll_interval = 0.005
+
+    def __init__(self, user):
+        self.user = user
+        self.key = self.key_template.format(user_id=user.pk)
+        self.lock_key = self.lock_key_template.format(user_id=user.pk)
+
+    @contextmanager
+    def _lock(self):
+        token = uuid.uuid4().hex
+        while not cache.add(self.lock_key, token, timeout=self.lock_timeout):
+            time.sleep(self.lock_poll_interval)
+        try:
+            yield
+        finally:
+            # Leave a lock that expired and was taken by someone else
+            if cache.get(self.lock_key) == token:
+                cache.delete(self.lock_key)
+
+    @asynccontextmanager
+    async def _alock(self):
+        token = uuid.uuid4().hex
+        while not await cache.aadd(self.lock_key, token, timeout=self.lock_timeout):
+            await asyncio.sleep(self.lock_poll_interval)
+        try:
+            yield
+        finally:
+            if await cache.aget(self.lock_key) == token:
+                await cache.adelete(self.lock_key)
+
+    def _load(self):
+        return cache.get(self.key) or {}
+
+    def _save(self, quantities):
+        if quantities:
+            cache.set(self.key, quantities, timeout=settings.CART_CACHE_TIMEOUT)
+        else:
+            cache.delete(self.key)
+
+    async def _aload(self):
+        return await cache.aget(self.key) or {}
+
+    async def _asave(self, quantities):
+        if quantities:
+            await cache.aset(self.key, quantities, timeout=settings.CART_CACHE_TIMEOUT)
+        else:
+            await cache.adelete(self.key)
+
+    def _total(self, quantities):
+        prices = dict(
+            MenuItem.objects.filter(id__in=quantities).values_list('id', 'price')
+        )
+        return sum(
+            (prices[item_id] * quantity for item_id, quantity in quantities.items() if item_id in prices),
+            Decimal('0')
+        )
+
+    def add(self, menu_item):
+        with self._lock():
+            quantities = self._load()
+            quantities[menu_item.id] = quantities.get(menu_item.id, 0) + 1
+            self._save(quantities)
+        return len(quantities)
+
+    async def aadd(self, menu_item):
+        async with self._alock():
+            quantities = await self._aload()
+            quantities[menu_item.id] = quantities.get(menu_item.id, 0) + 1
+            await self._asave(quantities)
+        return len(quantities)
+
+    def set_quantity(self, line_id, quantity):
+        """
+        Returns (cart total, cart count, line subtotal)
+        """
+        with self._lock():
+            quantities = self._load()
+            if line_id not in quantities:
+                raise CartItem.DoesNotExist()
+
+            if quantity > 0:
+                quantities[line_id] = quantity
+            else:
+                del quantities[line_id]
+            self._save(quantities)
+
+        total = self._total(quantities)
+        price = MenuItem.objects.filter(id=line_id).values_list('price', flat=True).first() or 0
+        return total, len(quantities), price * quantity if quantity > 0 else 0
+
+    def remove(self, line_id):
+        """
+        Returns (cart total, cart count)
+        """
+        total, count, _ = self.set_quantity(line_id, 0)
+        return total, count
+
+    def count(self):
+        return len(self._load())
+
+    async def acount(self):
+        return len(await self._aload())
+
+    def lines(self):
+        quantities = self._load()
+        menu_items = MenuItem.objects.in_bulk(list(quantities))
+        return [
+            CartItem(id=item_id, menu_item=menu_items[item_id], quantity=quantity)
+            for item_id, quantity in quantities.items()
+            if item_id in menu_items
+        ]
+
+    def checkout(self):
+        # Held until the cart is cleared, so nothing added meanwhile is lost
+        with self._lock():
+            cart_items = self.lines()
+            if not cart_items:
+                raise EmptyCartError()
+
+            with transaction.atomic():
+                order = services.create_order(self.user, cart_items)
+                transaction.on_commit(lambda: cache.delete(self.key))
+        return order
@@ -0,0 +1,155 @@
+"""
+Process pool for CPU-bound work done while handling a request.
+
+Rendering a QR code holds the GIL for milliseconds, and hashing a password
+keeps a core busy for far longer; a burst of either slows every other
+request on the worker. Code that does such work calls pool.run(), which
+runs it in one of CPU_POOL_WORKERS separate processes and waits for the
+result.
+
+The pool falls back to running the work in the calling thread, as it was
+run before, when:
+
+- CPU_POOL_WORKERS is 0;
+- CPU_POOL_MAX_PENDING tasks are already queued or running;
+- no process has taken the task after CPU_POOL_TIMEOUT seconds;
+- the pool cannot run the task, e.g. because a worker process died.
+
+A task already handed to a process is never run a second time in
+the calling thread; the caller waits for its result however long it takes.
+
+Errors raised by the work itself are raised to the caller as usual. Each
+task's wait for a process, run time and outcome are recorded in the
+request metrics as the task 'cpu_pool:<name>'.
+"""
+import atexit
+import logging
+import multiprocessing
+import os
+import signal
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from pickle import PicklingError
+
+from django.conf import settings
+
+from .metrics import registry
+
+logger = logging.getLogger(__name__)
+
+# Set in the pool's own processes, where work always runs inline
+_in_pool_process = False
+
+
+def _init_process(settings_module):
+    global _in_pool_process
+    _in_pool_process = True
+    # Ctrl+C reaches the whole process group; shutdown is left to the parent
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    os.environ['DJANGO_SETTINGS_MODULE'] = settings_module
+
+    import django
+
+    django.setup()
+
+
+def _call(func, args):
+    """
+    Run func in a pool process; returns (result, start, run time). The
+    monotonic clock is shared by all processes on the machine.
+    """
+    start = time.monotonic()
+    result = func(*args)
+    return result, start, time.monotonic() - start
+
+
+class CPUPool:
+    """
+    A lazily started ProcessPoolExecutor with a bound on pending tasks.
+    Each process gets its own executor, so workers forked from a preloading
+    master start their own.
+    """
+
+    def __init__(self, workers, max_pending, timeout):
+        self.workers = workers
+        self.timeout = timeout
+        self._pending = threading.BoundedSemaphore(max_pending)
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        with self._lock:
+            if self._pid != os.getpid():
+                # forkserver starts processes from a clean parent, not from
+                # this one and whatever threads it has running
+                methods = multiprocessing.get_all_start_methods()
+                context = multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+                self._executor = ProcessPoolExecutor(
+                    self.workers, mp_context=context,
+                    initializer=_init_process, initargs=(os.environ['DJANGO_SETTINGS_MODULE'],)
+                )
+                self._pid = os.getpid()
+                atexit.register(self._executor.shutdown, wait=False, cancel_futures=True)
+            return self._executor
+
+    def _reset(self, executor):
+        with self._lock:
+            if self._executor is executor:
+                self._pid = None
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def run(self, name, func, *args):
+        """
+        func(*args), run in the pool if it can take it. func and its
+        arguments must be picklable: a module-level function and plain values.
+        """
+        task = f'cpu_pool:{name}'
+        if self.workers <= 0 or _in_pool_process:
+            return self._run_inline(task, 'inline', func, args)
+        if not self._pending.acquire(blocking=False):
+            return self._run_inline(task, 'full', func, args)
+
+        executor = self._get_executor()
+        submitted = time.monotonic()
+        try:
+            future = executor.submit(_call, func, args)
+        except RuntimeError as e:
+            # Broken or shut down; the next task starts a new executor
+            self._pending.release()
+            logger.warning('CPU pool unavailable for %s: %s', task, e)
+            self._reset(executor)
+            return self._run_inline(task, 'error', func, args)
+        future.add_done_callback(lambda _: self._pending.release())
+
+        try:
+            try:
+                result, start, duration = future.result(self.timeout)
+            except FutureTimeoutError:
+                # cancel() fails once the task is handed to a process, which then
+                # runs it; running it here as well would do the work twice
+                if future.cancel():
+                    logger.warning('CPU pool did not start %s within %.1f s; running it here', task, self.timeout)
+                    return self._run_inline(task, 'timeout', func, args)
+                logger.warning('CPU pool took over %.1f s for %s; still waiting', self.timeout, task)
+                result, start, duration = future.result()
+        except (BrokenProcessPool, PicklingError) as e:
+            logger.warning('CPU pool failed %s: %s', task, e)
+            self._reset(executor)
+            return self._run_inline(task, 'error', func, args)
+
+        registry.observe_task(task, 'pool', wait=start - submitted, duration=duration)
+        return result
+
+    def _run_inline(self, task, outcome, func, args):
+        start = time.monotonic()
+        try:
+            return func(*args)
+        finally:
+            registry.observe_task(task, outcome, duration=time.monotonic() - start)
+
+
+pool = CPUPool(settings.CPU_POOL_WORKERS, settings.CPU_POOL_MAX_PENDING, settings.CPU_POOL_TIMEOUT)
@@ -0,0 +1,23 @@
+"""
+Password hashers whose work runs in the CPU pool
+"""
+import base64
+
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
+from django.utils.crypto import pbkdf2
+
+from .cpu_pool import pool
+
+
+class PooledPBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    """
+    Django's default hasher, computing the hash in the CPU pool. Same
+    algorithm name and format, so existing hashes verify unchanged.
+    """
+
+    def encode(self, password, salt, iterations=None):
+        self._check_encode_args(password, salt)
+        iterations = iterations or self.iterations
+        hash = pool.run('password_hash', pbkdf2, password, salt, iterations, 0, self.digest)
+        hash = base64.b64encode(hash).decode('ascii').strip()
+        return '%s$%d$%s$%s' % (self.algorithm, iterations, salt, hash)
@@ -0,0 +1,23 @@
+"""
+Health check shared by the quickbites and scanner projects
+"""
+from asgiref.sync import sync_to_async
+from django.db import DatabaseError, connection
+from django.http import JsonResponse
+
+
+def check_database():
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT 1')
+
+
+async def health_check(request):
+    """
+    Reports whether this worker can serve requests, for the process
+    manager and load balancers
+    """
+    try:
+        await sync_to_async(check_database)()
+    except DatabaseError:
+        return JsonResponse({'status': 'unavailable'}, status=503)
+    return JsonResponse({'status': 'ok'})
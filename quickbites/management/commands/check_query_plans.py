@@ -0,0 +1,79 @@
+import re
+import uuid
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Q
+from django.utils import timezone
+
+from quickbites.models import Feedback, MenuItem, Order
+
+
+def hot_queries():
+    """
+    The query shapes on the hot paths, with placeholder values
+    """
+    now = timezone.now()
+    return {
+        'profile order history': (
+            Order.objects.filter(user_id=1)
+            .only('id', 'total_amount', 'is_redeemed', 'created_at')
+            .order_by('-created_at', '-id')[:21]
+        ),
+        'profile order history next page': (
+            Order.objects.filter(user_id=1)
+            .filter(Q(created_at__lt=now) | Q(created_at=now, id__lt=uuid.uuid4()))
+            .only('id', 'total_amount', 'is_redeemed', 'created_at')
+            .order_by('-created_at', '-id')[:21]
+        ),
+        'menu snapshot': (
+            MenuItem.objects.filter(is_available=True).order_by('category', 'name')
+        ),
+        'menu by active sections': (
+            MenuItem.objects.filter(is_available=True, category__in=['breakfast', 'lunch'])
+            .order_by('category', 'name')
+        ),
+        'ticket redemption': (
+            Order.objects.filter(id=uuid.uuid4(), user__uprn='0000', is_redeemed=False)
+        ),
+        'order admin': Order.objects.order_by('-created_at'),
+        'order admin by status': Order.objects.filter(status='confirmed').order_by('-created_at'),
+        'order admin unredeemed': Order.objects.filter(is_redeemed=False).order_by('-created_at'),
+        'order admin redeemed': Order.objects.filter(is_redeemed=True).order_by('-created_at'),
+        'feedback admin': Feedback.objects.order_by('-created_at'),
+        'feedback admin unread': Feedback.objects.filter(is_read=False).order_by('-created_at'),
+    }
+
+
+# A bare "SCAN table" is a full table scan; "SCAN table USING INDEX" walks an index
+FULL_SCAN = re.compile(r'\bSCAN (\w+)\s*$')
+TEMP_SORT = 'USE TEMP B-TREE FOR ORDER BY'
+
+
+class Command(BaseCommand):
+    help = "EXPLAIN the hot queries and fail if any falls back to a full scan or a sort"
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError("Query plan checks are written for SQLite's EXPLAIN QUERY PLAN output")
+
+        problems = []
+        for name, queryset in hot_queries().items():
+            plan = queryset.explain()
+            issues = []
+            for line in plan.splitlines():
+                match = FULL_SCAN.search(line)
+                if match:
+                    issues.append(f"full scan of {match.group(1)}")
+                if TEMP_SORT in line:
+                    issues.append("sort not served by an index")
+
+            status = self.style.ERROR('FAIL') if issues else self.style.SUCCESS('ok')
+            self.stdout.write(f"[{status}] {name}")
+            for line in plan.splitlines():
+                self.stdout.write(f"    {line}")
+            problems.extend(f"{name}: {issue}" for issue in issues)
+
+        if problems:
+            raise CommandError("Hot queries without a usable index:\n" + "\n".join(problems))
+        self.stdout.write(self.style.SUCCESS("All hot queries use indexes"))
@@ -0,0 +1,75 @@
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Q
+from django.db.models.functions import Length
+
+from quickbites.models import Order
+from quickbites.services import order_qr_payload
+
+
+class Command(BaseCommand):
+    help = "Replace base64 PNG blobs stored in Order.qr_code with the short QR payload"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help='Number of orders rewritten per transaction (default: 500)'
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Report what would be reclaimed without writing anything'
+        )
+        parser.add_argument(
+            '--vacuum', action='store_true',
+            help='Run VACUUM afterwards so SQLite returns the freed pages to the OS'
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        dry_run = options['dry_run']
+
+        # Legacy rows hold a base64 PNG; compacted rows hold "ORDER:<uuid>:<uprn>".
+        # The blob itself is never loaded, only its length.
+        legacy_orders = (
+            Order.objects
+            .exclude(Q(qr_code='') | Q(qr_code__startswith='ORDER:'))
+            .annotate(qr_length=Length('qr_code'))
+            .order_by('pk')
+            .values_list('pk', 'user__uprn', 'qr_length')
+        )
+
+        rows = 0
+        bytes_reclaimed = 0
+        last_pk = None
+        while True:
+            batch_qs = legacy_orders
+            if last_pk is not None:
+                batch_qs = batch_qs.filter(pk__gt=last_pk)
+            batch = list(batch_qs[:batch_size])
+            if not batch:
+                break
+            last_pk = batch[-1][0]
+
+            updates = []
+            for pk, uprn, qr_length in batch:
+                payload = order_qr_payload(pk, uprn)
+                bytes_reclaimed += qr_length - len(payload)
+                updates.append(Order(pk=pk, qr_code=payload))
+
+            if not dry_run:
+                with transaction.atomic():
+                    Order.objects.bulk_update(updates, ['qr_code'])
+
+            rows += len(batch)
+            self.stdout.write(f"Processed {rows} orders...")
+
+        verb = 'Would compact' if dry_run else 'Compacted'
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {rows} orders, reclaiming {bytes_reclaimed} bytes "
+            f"({bytes_reclaimed / 1024:.1f} KiB)"
+        ))
+
+        if options['vacuum'] and not dry_run and connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                cursor.execute('VACUUM')
+            self.stdout.write("Vacuumed database")
@@ -0,0 +1,55 @@
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Q, Sum
+from django.db.models.functions import Coalesce
+
+from quickbites.models import Cart
+from quickbites.services import recalculate_cart_totals
+
+
+class Command(BaseCommand):
+    help = "Recompute Cart.item_count and Cart.total_amount from cart items and repair any drift"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Report drifted carts without repairing them'
+        )
+
+    def handle(self, *args, **options):
+        line_total = ExpressionWrapper(
+            F('cartitem__quantity') * F('cartitem__menu_item__price'),
+            output_field=DecimalField(max_digits=8, decimal_places=2)
+        )
+        drifted = (
+            Cart.objects
+            .annotate(
+                actual_count=Count('cartitem'),
+                actual_total=Coalesce(
+                    Sum(line_total), Decimal('0'),
+                    output_field=DecimalField(max_digits=8, decimal_places=2)
+                ),
+            )
+            .filter(~Q(item_count=F('actual_count')) | ~Q(total_amount=F('actual_total')))
+            .values_list('pk', 'item_count', 'actual_count', 'total_amount', 'actual_total')
+        )
+
+        drifted_ids = []
+        for pk, item_count, actual_count, total_amount, actual_total in drifted:
+            drifted_ids.append(pk)
+            self.stdout.write(
+                f"Cart {pk}: item_count {item_count} -> {actual_count}, "
+                f"total_amount {total_amount} -> {actual_total}"
+            )
+
+        if not drifted_ids:
+            self.stdout.write(self.style.SUCCESS("All cart totals are consistent"))
+            return
+
+        if options['dry_run']:
+            self.stdout.write(f"{len(drifted_ids)} carts have drifted")
+            return
+
+        repaired = recalculate_cart_totals(Cart.objects.filter(pk__in=drifted_ids))
+        self.stdout.write(self.style.SUCCESS(f"Repaired {repaired} carts"))
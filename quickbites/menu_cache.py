@@ -0,0 +1,86 @@
+"""
+Versioned cache for the menu and offers pages.
+
+The menu changes a few times a day but is read on almost every request, so
+the grouped menu is cached as a snapshot keyed by a "menu version". Saving or
+deleting a MenuItem or MenuSection bumps the version, which makes every
+previously cached snapshot unreachable without having to delete it.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import MenuItem, MenuSection
+
+MENU_VERSION_KEY = 'quickbites:menu:version'
+MENU_SNAPSHOT_KEY = 'quickbites:menu:snapshot:{version}'
+
+
+def _initial_version():
+    # Seed from the clock so a version lost to eviction or a restart never
+    # falls back to a number an older snapshot may still be stored under.
+    return int(time.time() * 1000)
+
+
+def get_menu_version():
+    """
+    Return the current menu version, initialising it if needed
+    """
+    version = cache.get(MENU_VERSION_KEY)
+    if version is None:
+        cache.add(MENU_VERSION_KEY, _initial_version(), timeout=None)
+        version = cache.get(MENU_VERSION_KEY)
+    return version
+
+
+def bump_menu_version():
+    """
+    Invalidate every cached menu snapshot by moving to a new version
+    """
+    try:
+        return cache.incr(MENU_VERSION_KEY)
+    except ValueError:
+        cache.add(MENU_VERSION_KEY, _initial_version(), timeout=None)
+        return cache.incr(MENU_VERSION_KEY)
+
+
+def build_menu_snapshot():
+    """
+    Load the menu from the database and group it the way the pages use it
+    """
+    active_sections = set(
+        MenuSection.objects.filter(is_active=True).values_list('name', flat=True)
+    )
+    menu_items = MenuItem.objects.filter(is_available=True).order_by('category', 'name')
+
+    # Group items by category
+    menu_by_category = {}
+    offers = []
+    for item in menu_items:
+        if item.category == 'offer':
+            offers.append(item)
+        if item.category not in active_sections:
+            continue
+        if item.category not in menu_by_category:
+            menu_by_category[item.category] = []
+        menu_by_category[item.category].append(item)
+
+    offers.sort(key=lambda item: item.pk)
+
+    return {
+        'menu_by_category': menu_by_category,
+        'offers': offers,
+    }
+
+
+def get_menu_snapshot():
+    """
+    Return the cached menu snapshot, rebuilding it on a miss
+    """
+    key = MENU_SNAPSHOT_KEY.format(version=get_menu_version())
+    snapshot = cache.get(key)
+    if snapshot is None:
+        snapshot = build_menu_snapshot()
+        cache.set(key, snapshot, timeout=settings.MENU_CACHE_TIMEOUT)
+    return snapshot
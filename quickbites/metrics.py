@@ -0,0 +1,428 @@
+"""
+Per-view request metrics, served in the Prometheus text format.
+
+RequestMetricsMiddleware times each request, counts its database queries
+and their time, and measures the response. It adds these to histograms
+kept in memory for each view.
+
+The query timer is installed on each database connection as it opens, so it
+also counts queries that an async view runs on sync_to_async threads.
+
+When the app runs as several worker processes, METRICS_DIR names a
+directory where each worker saves its histograms a few seconds after they
+change. The metrics endpoint adds up every worker's file, so one scrape
+covers them all.
+
+Background tasks, such as pre-rendering ticket QR codes, report how long
+each waited in its queue and ran, and how many ended each way, by task.
+
+Each request gets an ID: the one in its X-Request-ID header if valid, else
+a new one. The ID is returned in the response, and the scanner sends it on
+when it proxies a scan, so one scan can be followed through both apps.
+"""
+import json
+import logging
+import os
+import re
+import threading
+import time
+import uuid
+from bisect import bisect_left
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+from django.utils.crypto import constant_time_compare
+
+logger = logging.getLogger(__name__)
+
+REQUEST_ID_HEADER = 'X-Request-ID'
+REQUEST_ID_PATTERN = re.compile(r'^[A-Za-z0-9._-]{1,64}$')
+
+DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+SIZE_BUCKETS = (128, 1024, 8192, 65536, 524288, 4194304)
+
+# Metric name: (buckets, help text)
+HISTOGRAMS = {
+    'quickbites_request_duration_seconds': (DURATION_BUCKETS, 'Wall time from request to response'),
+    'quickbites_request_db_queries': (QUERY_BUCKETS, 'Database queries run by the request'),
+    'quickbites_request_db_duration_seconds': (DURATION_BUCKETS, 'Time spent in database queries'),
+    'quickbites_response_size_bytes': (SIZE_BUCKETS, 'Response body size; streamed responses are not counted'),
+}
+
+TASK_HISTOGRAMS = {
+    'quickbites_task_wait_seconds': (DURATION_BUCKETS, 'Time a background task waited to start'),
+    'quickbites_task_duration_seconds': (DURATION_BUCKETS, 'Time a background task ran for'),
+}
+
+# Quantiles reported alongside each histogram
+QUANTILES = (0.5, 0.95, 0.99)
+
+# Seconds a worker's changed histograms wait before being saved to METRICS_DIR
+SAVE_DELAY = 5
+
+
+class Histogram:
+    """
+    Counts of observations per bucket, the last bucket being +Inf
+    """
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+
+    @property
+    def count(self):
+        return sum(self.counts)
+
+    def observe(self, value):
+        # Buckets are upper bounds, inclusive as in Prometheus
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    def merge(self, data):
+        for i, count in enumerate(data['counts']):
+            self.counts[i] += count
+        self.sum += data['sum']
+
+    def to_dict(self):
+        return {'counts': list(self.counts), 'sum': self.sum}
+
+    def quantile(self, q):
+        """
+        Estimate of a quantile, interpolated inside the bucket that holds it
+        as Prometheus's histogram_quantile does. None when empty.
+        """
+        rank = q * self.count
+        cumulative = 0
+        for i, count in enumerate(self.counts):
+            if count and cumulative + count >= rank:
+                if i == len(self.buckets):
+                    return self.buckets[-1]
+                lower = self.buckets[i - 1] if i else 0
+                return lower + (self.buckets[i] - lower) * (rank - cumulative) / count
+            cumulative += count
+        return None
+
+
+class ViewMetrics:
+    def __init__(self):
+        self.histograms = {name: Histogram(buckets) for name, (buckets, _) in HISTOGRAMS.items()}
+        self.responses = {}
+
+    def merge(self, data):
+        for name, histogram in data['histograms'].items():
+            self.histograms[name].merge(histogram)
+        for status, count in data['responses'].items():
+            self.responses[status] = self.responses.get(status, 0) + count
+
+    def to_dict(self):
+        return {
+            'histograms': {name: histogram.to_dict() for name, histogram in self.histograms.items()},
+            'responses': dict(self.responses),
+        }
+
+
+class TaskMetrics:
+    def __init__(self):
+        self.histograms = {name: Histogram(buckets) for name, (buckets, _) in TASK_HISTOGRAMS.items()}
+        self.outcomes = {}
+
+    def merge(self, data):
+        for name, histogram in data['histograms'].items():
+            self.histograms[name].merge(histogram)
+        for outcome, count in data['outcomes'].items():
+            self.outcomes[outcome] = self.outcomes.get(outcome, 0) + count
+
+    def to_dict(self):
+        return {
+            'histograms': {name: histogram.to_dict() for name, histogram in self.histograms.items()},
+            'outcomes': dict(self.outcomes),
+        }
+
+
+class MetricsRegistry:
+    """
+    This process's metrics, by view and by background task. Safe to update
+    from any thread.
+    """
+
+    def __init__(self):
+        self._views = {}
+        self._tasks = {}
+        self._lock = threading.Lock()
+        self._save_timer = None
+        # Saves come from the timer and from collect(); one at a time, so they
+        # neither share the temporary file nor land out of order. Separate
+        # from _lock so requests never wait on the disk.
+        self._save_lock = threading.Lock()
+
+    def observe(self, view, status, duration, queries, db_duration, size):
+        with self._lock:
+            metrics = self._views.get(view)
+            if metrics is None:
+                metrics = self._views[view] = ViewMetrics()
+            histograms = metrics.histograms
+            histograms['quickbites_request_duration_seconds'].observe(duration)
+            histograms['quickbites_request_db_queries'].observe(queries)
+            histograms['quickbites_request_db_duration_seconds'].observe(db_duration)
+            if size is not None:
+                histograms['quickbites_response_size_bytes'].observe(size)
+            status = str(status)
+            metrics.responses[status] = metrics.responses.get(status, 0) + 1
+            self._schedule_save()
+
+    def observe_task(self, task, outcome, wait=None, duration=None):
+        """
+        Count a background task's outcome, with its times if it ran
+        """
+        with self._lock:
+            metrics = self._tasks.get(task)
+            if metrics is None:
+                metrics = self._tasks[task] = TaskMetrics()
+            if wait is not None:
+                metrics.histograms['quickbites_task_wait_seconds'].observe(wait)
+            if duration is not None:
+                metrics.histograms['quickbites_task_duration_seconds'].observe(duration)
+            metrics.outcomes[outcome] = metrics.outcomes.get(outcome, 0) + 1
+            self._schedule_save()
+
+    def _schedule_save(self):
+        # Call with the lock held
+        if settings.METRICS_DIR and self._save_timer is None:
+            # Batches the writes: one save covers every change in the delay
+            self._save_timer = threading.Timer(SAVE_DELAY, self.save)
+            self._save_timer.daemon = True
+            self._save_timer.start()
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'views': {view: metrics.to_dict() for view, metrics in self._views.items()},
+                'tasks': {task: metrics.to_dict() for task, metrics in self._tasks.items()},
+            }
+
+    def save(self):
+        """
+        Write this process's metrics to METRICS_DIR for the other workers to read
+        """
+        with self._lock:
+            self._save_timer = None
+        os.makedirs(settings.METRICS_DIR, exist_ok=True)
+        path = os.path.join(settings.METRICS_DIR, f'{os.getpid()}.json')
+        with self._save_lock:
+            with open(f'{path}.tmp', 'w') as f:
+                json.dump(self.snapshot(), f)
+            os.replace(f'{path}.tmp', path)
+
+    def collect(self):
+        """
+        ({view: ViewMetrics}, {task: TaskMetrics}) of every worker when
+        METRICS_DIR is set, else of this process
+        """
+        if not settings.METRICS_DIR:
+            snapshots = [self.snapshot()]
+        else:
+            self.save()
+            snapshots = []
+            for entry in os.scandir(settings.METRICS_DIR):
+                if not entry.name.endswith('.json'):
+                    continue
+                try:
+                    with open(entry.path) as f:
+                        snapshots.append(json.load(f))
+                except (OSError, ValueError):
+                    # Being replaced by its worker; its counts arrive next scrape
+                    continue
+
+        views, tasks = {}, {}
+        for snapshot in snapshots:
+            for view, data in snapshot['views'].items():
+                views.setdefault(view, ViewMetrics()).merge(data)
+            for task, data in snapshot['tasks'].items():
+                tasks.setdefault(task, TaskMetrics()).merge(data)
+        return views, tasks
+
+
+registry = MetricsRegistry()
+
+
+class RequestStats:
+    __slots__ = ('queries', 'db_duration')
+
+    def __init__(self):
+        self.queries = 0
+        self.db_duration = 0.0
+
+
+# Context variables reach the threads sync_to_async runs code on
+_request_stats = ContextVar('request_stats', default=None)
+_request_id = ContextVar('request_id', default=None)
+
+
+def current_request_id():
+    """
+    ID of the request being handled, or None outside a request
+    """
+    return _request_id.get()
+
+
+def time_query(execute, sql, params, many, context):
+    stats = _request_stats.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.queries += 1
+        stats.db_duration += time.perf_counter() - start
+
+
+def install_query_timer(sender, connection, **kwargs):
+    """
+    connection_created receiver adding the query timer to new connections
+    """
+    if time_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(time_query)
+
+
+def format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def escape_label(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def render_histograms(lines, histograms, label_name, metrics):
+    """
+    Append each histogram, and its quantiles, for metrics by label value
+    """
+    for name, (buckets, help_text) in histograms.items():
+        lines += [f'# HELP {name} {help_text}', f'# TYPE {name} histogram']
+        for value in sorted(metrics):
+            label = f'{label_name}="{escape_label(value)}"'
+            histogram = metrics[value].histograms[name]
+            cumulative = 0
+            for bound, count in zip(buckets + ('+Inf',), histogram.counts):
+                cumulative += count
+                lines.append(f'{name}_bucket{{{label},le="{bound}"}} {cumulative}')
+            lines.append(f'{name}_sum{{{label}}} {format_value(histogram.sum)}')
+            lines.append(f'{name}_count{{{label}}} {histogram.count}')
+
+        lines += [f'# HELP {name}_quantile Estimated from the histogram buckets', f'# TYPE {name}_quantile gauge']
+        for value in sorted(metrics):
+            histogram = metrics[value].histograms[name]
+            for q in QUANTILES:
+                estimate = histogram.quantile(q)
+                if estimate is not None:
+                    lines.append(
+                        f'{name}_quantile{{{label_name}="{escape_label(value)}",quantile="{q}"}} {format_value(estimate)}'
+                    )
+
+
+def render_metrics(views, tasks=None):
+    """
+    Prometheus text exposition of metrics by view and by background task
+    """
+    lines = []
+    render_histograms(lines, HISTOGRAMS, 'view', views)
+    lines += ['# HELP quickbites_responses_total Responses by view and status', '# TYPE quickbites_responses_total counter']
+    for view in sorted(views):
+        for status, count in sorted(views[view].responses.items()):
+            lines.append(f'quickbites_responses_total{{view="{escape_label(view)}",status="{status}"}} {count}')
+
+    if tasks:
+        render_histograms(lines, TASK_HISTOGRAMS, 'task', tasks)
+        lines += ['# HELP quickbites_tasks_total Background tasks by outcome', '# TYPE quickbites_tasks_total counter']
+        for task in sorted(tasks):
+            for outcome, count in sorted(tasks[task].outcomes.items()):
+                lines.append(f'quickbites_tasks_total{{task="{escape_label(task)}",outcome="{outcome}"}} {count}')
+    return '\n'.join(lines) + '\n'
+
+
+class RequestMetricsMiddleware:
+    """
+    Records each request's wall time, query count, query time and response
+    size for its view, and tags the request and response with a request ID.
+    Put it first in MIDDLEWARE so the time covers the other middleware.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        stats, tokens = self.start(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            self.reset(tokens)
+        return self.finish(request, response, stats)
+
+    async def __acall__(self, request):
+        stats, tokens = self.start(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            self.reset(tokens)
+        return self.finish(request, response, stats)
+
+    def start(self, request):
+        request._metrics_start = time.perf_counter()
+        request_id = request.headers.get(REQUEST_ID_HEADER, '')
+        if not REQUEST_ID_PATTERN.match(request_id):
+            request_id = uuid.uuid4().hex
+        request.request_id = request_id
+        stats = RequestStats()
+        return stats, (_request_id.set(request_id), _request_stats.set(stats))
+
+    def reset(self, tokens):
+        request_id_token, stats_token = tokens
+        _request_stats.reset(stats_token)
+        _request_id.reset(request_id_token)
+
+    def finish(self, request, response, stats):
+        duration = time.perf_counter() - request._metrics_start
+        match = request.resolver_match
+        # Paths that match no URL are not used as labels, which would be unbounded
+        view = match.view_name if match else 'unmatched'
+        size = None if response.streaming else len(response.content)
+        registry.observe(view, response.status_code, duration, stats.queries, stats.db_duration, size)
+
+        response[REQUEST_ID_HEADER] = request.request_id
+        logger.debug(
+            '%s %s -> %s in %.1f ms, %d queries in %.1f ms [request %s]',
+            request.method, request.path, response.status_code, duration * 1000,
+            stats.queries, stats.db_duration * 1000, request.request_id
+        )
+        return response
+
+
+def has_metrics_token(request):
+    token = settings.METRICS_TOKEN
+    authorization = request.headers.get('Authorization', '')
+    return bool(token) and constant_time_compare(authorization, f'Bearer {token}')
+
+
+def metrics_view(request):
+    """
+    Request metrics in the Prometheus text format. Staff only; a scraper
+    can send METRICS_TOKEN as a bearer token instead of logging in.
+    """
+    if not (request.user.is_staff or has_metrics_token(request)):
+        return HttpResponseForbidden()
+    return HttpResponse(
+        render_metrics(*registry.collect()),
+        content_type='text/plain; version=0.0.4; charset=utf-8'
+    )
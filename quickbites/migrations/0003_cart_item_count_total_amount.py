@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-17 21:41
+
+from django.db import migrations, models
+
+
+def backfill_cart_totals(apps, schema_editor):
+    Cart = apps.get_model('quickbites', 'Cart')
+    CartItem = apps.get_model('quickbites', 'CartItem')
+
+    carts = {}
+    for item in CartItem.objects.select_related('menu_item'):
+        count, total = carts.get(item.cart_id, (0, 0))
+        carts[item.cart_id] = (count + 1, total + item.menu_item.price * item.quantity)
+
+    for cart_id, (count, total) in carts.items():
+        Cart.objects.filter(pk=cart_id).update(item_count=count, total_amount=total)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quickbites', '0002_alter_user_managers'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cart',
+            name='item_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='cart',
+            name='total_amount',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=8),
+        ),
+        migrations.RunPython(backfill_cart_totals, migrations.RunPython.noop),
+    ]
@@ -76,8 +76,28 @@ class MenuItem(models.Model):
     is_available = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
     
+    class Meta:
+        indexes = [
+            # Menu snapshot: available items ordered by category and name.
+            # Partial, because SQLite filters booleans as a bare column test,
+            # which a leading boolean index column cannot serve.
+            models.Index(
+                fields=['category', 'name'],
+                condition=models.Q(is_available=True),
+                name='menuitem_available_idx'
+            ),
+        ]
+    
     def __str__(self):
         return f"{self.name} - ₹{self.price}"
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # The price as loaded, so a save can tell whether it changed (see signals.py);
+        # None if it was deferred
+        instance._loaded_price = instance.__dict__.get('price')
+        return instance
 
 class Cart(models.Model):
     """
@@ -86,9 +106,12 @@ class Cart(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Kept in step with the cart's items so counts and totals need no aggregate
+    item_count = models.PositiveIntegerField(default=0)
+    total_amount = models.DecimalField(max_digits=8, decimal_places=2, default=0)
     
     def get_total(self):
-        return sum(item.get_subtotal() for item in self.cartitem_set.all())
+        return self.total_amount
 
 class CartItem(models.Model):
     """
@@ -123,6 +146,21 @@ class Order(models.Model):
     is_redeemed = models.BooleanField(default=False)
     redeemed_at = models.DateTimeField(null=True, blank=True)
     
+    class Meta:
+        indexes = [
+            # Order history in the profile page, keyset paginated on (created_at, id)
+            models.Index(fields=['user', '-created_at', '-id'], name='order_user_created_id_idx'),
+            # Admin changelist, unfiltered and filtered by status
+            models.Index(fields=['-created_at'], name='order_created_idx'),
+            models.Index(fields=['status', '-created_at'], name='order_status_created_idx'),
+            # Outstanding tickets only; stays small as orders are collected
+            models.Index(
+                fields=['-created_at'],
+                condition=models.Q(is_redeemed=False),
+                name='order_unredeemed_idx'
+            ),
+        ]
+    
     def __str__(self):
         return f"Order {self.id} - {self.user.name}"
 
@@ -149,6 +187,17 @@ class Feedback(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     is_read = models.BooleanField(default=False)
     
+    class Meta:
+        indexes = [
+            # Admin changelist, unfiltered and unread first
+            models.Index(fields=['-created_at'], name='feedback_created_idx'),
+            models.Index(
+                fields=['-created_at'],
+                condition=models.Q(is_read=False),
+                name='feedback_unread_idx'
+            ),
+        ]
+    
     def __str__(self):
         return f"Feedback from {self.user.name} - {self.subject}"
 
@@ -0,0 +1,405 @@
+"""
+In-process publish/subscribe for order changes, streamed as server-sent events.
+
+Writers publish a snapshot of each changed order once their transaction
+commits. Async views subscribe to a topic and stream what arrives. Each
+subscriber is an asyncio queue, so an idle connection costs a queue and a
+suspended coroutine rather than a thread, and nothing polls the database.
+
+When the app runs as several worker processes, ORDER_EVENTS_BUS_DIR names
+a directory where each worker with subscribers listens on a Unix datagram
+socket; changes are sent to every worker there, so a stream sees changes
+made by any worker. A process that changes orders but serves no streams
+(the scanner in direct mode) sets ORDER_EVENTS_FORWARD_URL to hand its
+changes to the main app instead.
+"""
+import asyncio
+import atexit
+import json
+import logging
+import os
+import queue
+import socket
+import threading
+import uuid
+from collections import defaultdict
+from functools import partial
+
+import requests
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import PermissionDenied
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+
+from .models import Order, OrderItem
+
+logger = logging.getLogger(__name__)
+
+KITCHEN_TOPIC = 'kitchen'
+
+# Orders the kitchen still has to deal with
+KITCHEN_STATUSES = ('confirmed', 'preparing', 'ready')
+
+# Most orders sent to a kitchen display when it connects
+KITCHEN_SNAPSHOT_LIMIT = 200
+
+# How long a browser waits before asking again for a stream that was not
+# held open, in milliseconds
+SNAPSHOT_RETRY_MS = 5000
+
+
+def order_topic(order_id):
+    return f'order:{order_id}'
+
+
+class Subscription:
+    """
+    A subscriber's queue of events, bound to the event loop it was created on
+    """
+
+    def __init__(self, topics, maxsize):
+        self.topics = topics
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize)
+        # Set when events were dropped for a slow client; it must resync
+        self.overflowed = False
+
+    def deliver(self, event):
+        # Runs on the subscriber's event loop
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+    async def get(self, timeout):
+        """
+        Next event, or None if nothing arrives within timeout seconds
+        """
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class EventBroker:
+    """
+    Fans events out to the subscribers of a topic. Safe to publish from any
+    thread, including the sync views run in a thread pool under ASGI.
+    """
+
+    def __init__(self, queue_size):
+        self.queue_size = queue_size
+        self._subscribers = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def subscribe(self, *topics):
+        subscription = Subscription(topics, self.queue_size)
+        if bus is not None:
+            bus.listen(subscription.loop)
+        with self._lock:
+            for topic in topics:
+                self._subscribers[topic].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            for topic in subscription.topics:
+                subscribers = self._subscribers.get(topic)
+                if subscribers is not None:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self._subscribers[topic]
+
+    def has_subscribers(self, topic):
+        with self._lock:
+            return bool(self._subscribers.get(topic))
+
+    def publish(self, topic, event):
+        with self._lock:
+            subscribers = list(self._subscribers.get(topic, ()))
+        for subscription in subscribers:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.deliver, event)
+            except RuntimeError:
+                # The subscriber's event loop has shut down
+                self.unsubscribe(subscription)
+
+
+class WorkerBus:
+    """
+    Sends changed order ids to every worker process on this machine over
+    Unix datagram sockets in a shared directory. A worker starts listening
+    when its first stream subscribes, and publishes what it receives to its
+    own subscribers. Delivery is best effort: a worker whose socket buffer
+    is full misses the change.
+    """
+
+    # Order ids per datagram, well inside the default socket buffer
+    chunk_size = 500
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._sock = None
+        # Process that is listening; a forked child must bind its own socket
+        self._listening_pid = None
+        self._lock = threading.Lock()
+
+    def listen(self, loop):
+        """
+        Start receiving on an event loop, once per process
+        """
+        with self._lock:
+            if self._listening_pid == os.getpid():
+                return
+            os.makedirs(self.directory, exist_ok=True)
+            path = os.path.join(self.directory, f'{os.getpid()}.sock')
+            if os.path.exists(path):
+                os.unlink(path)
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            sock.bind(path)
+            sock.setblocking(False)
+            self._listening_pid = os.getpid()
+        loop.add_reader(sock.fileno(), self._receive, loop, sock)
+        atexit.register(self._remove, path)
+
+    def _remove(self, path):
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+
+    def _receive(self, loop, sock):
+        while True:
+            try:
+                data = sock.recv(65536)
+            except BlockingIOError:
+                return
+            # The snapshot read is sync ORM work; keep it off the event loop
+            loop.run_in_executor(None, publish_local, json.loads(data))
+
+    def publish(self, order_ids):
+        if self._sock is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            sock.setblocking(False)
+            self._sock = sock
+        try:
+            peers = [entry.path for entry in os.scandir(self.directory) if entry.name.endswith('.sock')]
+        except FileNotFoundError:
+            # No worker has a subscriber yet
+            return
+
+        order_ids = [str(order_id) for order_id in order_ids]
+        for i in range(0, len(order_ids), self.chunk_size):
+            payload = json.dumps(order_ids[i:i + self.chunk_size]).encode()
+            for path in peers:
+                try:
+                    self._sock.sendto(payload, path)
+                except (ConnectionRefusedError, FileNotFoundError):
+                    # The worker that bound this socket has exited
+                    self._remove(path)
+                except OSError as e:
+                    logger.warning('Could not send order events to %s: %s', path, e)
+
+
+bus = WorkerBus(settings.ORDER_EVENTS_BUS_DIR) if settings.ORDER_EVENTS_BUS_DIR else None
+
+broker = EventBroker(queue_size=settings.ORDER_EVENTS_QUEUE_SIZE)
+
+
+class EventForwarder:
+    """
+    Posts changed order ids to another process's order events endpoint from
+    a background thread, so the write path never waits on the network.
+    Best effort: ids are dropped if the endpoint is down or the backlog is full.
+    """
+
+    def __init__(self, url, token=None, backlog=1000):
+        self.url = url
+        self.headers = {'Authorization': f'Bearer {token}'} if token else {}
+        self._queue = queue.Queue(backlog)
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, order_ids):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='order-events-forwarder', daemon=True)
+                self._thread.start()
+        try:
+            self._queue.put_nowait([str(order_id) for order_id in order_ids])
+        except queue.Full:
+            logger.warning('Order events backlog full; dropped %d order ids', len(order_ids))
+
+    def _run(self):
+        session = requests.Session()
+        while True:
+            order_ids = self._queue.get()
+            # Coalesce whatever else is waiting into one request
+            while not self._queue.empty():
+                order_ids.extend(self._queue.get_nowait())
+            try:
+                response = session.post(self.url, json={'order_ids': order_ids}, headers=self.headers, timeout=2)
+                response.raise_for_status()
+            except requests.RequestException as e:
+                logger.warning('Could not forward order events to %s: %s', self.url, e)
+
+
+forwarder = (
+    EventForwarder(settings.ORDER_EVENTS_FORWARD_URL, settings.ORDER_EVENTS_TOKEN)
+    if settings.ORDER_EVENTS_FORWARD_URL else None
+)
+
+
+def order_snapshots(orders):
+    """
+    Event payloads for a queryset of orders, in two queries
+    """
+    snapshots = {
+        row['id']: {
+            'id': str(row['id']),
+            'status': row['status'],
+            'status_display': dict(Order.STATUS_CHOICES).get(row['status'], row['status']),
+            'is_redeemed': row['is_redeemed'],
+            'redeemed_at': row['redeemed_at'],
+            'total_amount': row['total_amount'],
+            'customer': row['user__name'],
+            'created_at': row['created_at'],
+            'items': [],
+        }
+        for row in orders.values(
+            'id', 'status', 'is_redeemed', 'redeemed_at', 'total_amount', 'user__name', 'created_at'
+        )
+    }
+    lines = (
+        OrderItem.objects.filter(order__in=list(snapshots))
+        .order_by('pk')
+        .values('order', 'menu_item__name', 'quantity')
+    )
+    for line in lines:
+        snapshots[line['order']]['items'].append({
+            'name': line['menu_item__name'],
+            'quantity': line['quantity'],
+        })
+    return list(snapshots.values())
+
+
+def kitchen_snapshot():
+    """
+    The orders a kitchen display shows when it connects, oldest first
+    """
+    return order_snapshots(
+        Order.objects.filter(status__in=KITCHEN_STATUSES)
+        .order_by('created_at')[:KITCHEN_SNAPSHOT_LIMIT]
+    )
+
+
+def order_snapshot(order_id):
+    """
+    The current state of one order, sent when its status stream connects
+    """
+    snapshots = order_snapshots(Order.objects.filter(id=order_id))
+    return snapshots[0] if snapshots else None
+
+
+def _uuids(order_ids):
+    for order_id in order_ids:
+        try:
+            yield order_id if isinstance(order_id, uuid.UUID) else uuid.UUID(str(order_id))
+        except ValueError:
+            continue
+
+
+def publish_orders(order_ids):
+    """
+    Publish the current state of orders to every process serving streams
+    """
+    if forwarder is not None:
+        forwarder.submit(order_ids)
+    elif bus is not None:
+        bus.publish(order_ids)
+    else:
+        publish_local(order_ids)
+
+
+def publish_local(order_ids):
+    """
+    Publish the current state of orders to this process's kitchen and
+    per-order subscribers. Skips the database when no one is listening.
+    """
+    order_ids = [
+        order_id for order_id in _uuids(order_ids)
+        if broker.has_subscribers(KITCHEN_TOPIC) or broker.has_subscribers(order_topic(order_id))
+    ]
+    if not order_ids:
+        return
+
+    for snapshot in order_snapshots(Order.objects.filter(id__in=order_ids)):
+        broker.publish(KITCHEN_TOPIC, snapshot)
+        broker.publish(order_topic(snapshot['id']), snapshot)
+
+
+def publish_orders_on_commit(order_ids):
+    """
+    Publish orders once the current transaction commits
+    """
+    order_ids = list(order_ids)
+    if order_ids:
+        transaction.on_commit(lambda: publish_orders(order_ids))
+
+
+def sse_message(event, data):
+    payload = json.dumps(data, cls=DjangoJSONEncoder)
+    return f"event: {event}\ndata: {payload}\n\n"
+
+
+async def stream_events(topic, snapshot, live=True):
+    """
+    Server-sent event stream for a topic: a 'snapshot' event from the
+    snapshot callable, then an 'order' event per change. Sends a keepalive
+    comment when idle, and a fresh snapshot if the client fell behind.
+
+    When live is False the stream ends after the snapshot, telling the
+    browser to ask again after SNAPSHOT_RETRY_MS; for servers that would
+    hold a thread for as long as the stream stays open.
+    """
+    if not live:
+        yield f"retry: {SNAPSHOT_RETRY_MS}\n" + sse_message('snapshot', await sync_to_async(snapshot)())
+        return
+
+    # Subscribe before reading the snapshot so no change slips between them
+    subscription = broker.subscribe(topic)
+    try:
+        yield sse_message('snapshot', await sync_to_async(snapshot)())
+        while True:
+            event = await subscription.get(timeout=settings.ORDER_EVENTS_KEEPALIVE)
+            if subscription.overflowed:
+                subscription.overflowed = False
+                while not subscription.queue.empty():
+                    subscription.queue.get_nowait()
+                yield sse_message('snapshot', await sync_to_async(snapshot)())
+            elif event is None:
+                yield ": keepalive\n\n"
+            else:
+                yield sse_message('order', event)
+    finally:
+        broker.unsubscribe(subscription)
+
+
+async def kitchen_events(user, live=True):
+    """
+    Event stream for a kitchen display. Raises PermissionDenied for non-staff.
+    """
+    if not user.is_staff:
+        raise PermissionDenied
+    return stream_events(KITCHEN_TOPIC, kitchen_snapshot, live)
+
+
+async def order_status_events(user, order_id, live=True):
+    """
+    Event stream for one of the user's orders.
+    Raises Order.DoesNotExist if the user has no such order.
+    """
+    if not user.is_authenticated or not await Order.objects.filter(id=order_id, user=user).aexists():
+        raise Order.DoesNotExist
+    return stream_events(order_topic(order_id), partial(order_snapshot, order_id), live)
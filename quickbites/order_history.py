@@ -0,0 +1,76 @@
+"""
+Keyset pagination for a user's order history.
+
+Pages are ordered newest first by (created_at, id) and continue from an
+opaque cursor holding the last row's key, so fetching page 50 costs the same
+as page 1 and rows are never skipped or repeated as new orders arrive.
+"""
+import base64
+import binascii
+import uuid
+
+from django.db.models import Q, Sum
+from django.utils.dateparse import parse_datetime
+
+from .models import Order, OrderItem
+
+# Columns the profile page shows; the rest of the row is never loaded
+HISTORY_FIELDS = ('id', 'total_amount', 'is_redeemed', 'created_at')
+
+
+class InvalidCursor(Exception):
+    """
+    Raised for a cursor that was not produced by encode_cursor
+    """
+
+
+def encode_cursor(order):
+    key = f"{order.created_at.isoformat()}|{order.id}"
+    return base64.urlsafe_b64encode(key.encode()).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        created_at, order_id = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+        created_at = parse_datetime(created_at)
+        order_id = uuid.UUID(order_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise InvalidCursor(cursor)
+    if created_at is None:
+        raise InvalidCursor(cursor)
+    return created_at, order_id
+
+
+def order_history_page(user, page_size, cursor=None):
+    """
+    Return (orders, next cursor) for one page of a user's order history.
+    Each order carries an item_count, loaded for the whole page in one
+    aggregate query. The next cursor is None on the last page.
+    """
+    orders = (
+        Order.objects.filter(user=user)
+        .only(*HISTORY_FIELDS)
+        .order_by('-created_at', '-id')
+    )
+    if cursor:
+        created_at, order_id = decode_cursor(cursor)
+        orders = orders.filter(
+            Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=order_id)
+        )
+
+    # Fetch one extra row to learn whether another page follows
+    orders = list(orders[:page_size + 1])
+    has_more = len(orders) > page_size
+    orders = orders[:page_size]
+
+    item_counts = dict(
+        OrderItem.objects.filter(order__in=[order.id for order in orders])
+        .values('order')
+        .annotate(count=Sum('quantity'))
+        .values_list('order', 'count')
+    )
+    for order in orders:
+        order.item_count = item_counts.get(order.id, 0)
+
+    next_cursor = encode_cursor(orders[-1]) if has_more else None
+    return orders, next_cursor
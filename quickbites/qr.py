@@ -0,0 +1,244 @@
+"""
+Ticket QR code rendering and caching.
+
+Ticket images are derived from the order's QR payload, which never changes,
+so a rendered image can be cached indefinitely. Renders are kept in a small
+in-memory LRU in front of an on-disk cache shared by all worker processes.
+
+TICKET_QR_FORMAT picks what the ticket page shows:
+
+- 'png': a PNG drawn with Pillow;
+- 'svg': an SVG path, written without Pillow;
+- 'matrix': the packed modules, which the page draws to a canvas.
+"""
+import base64
+import hashlib
+import io
+import os
+import threading
+from collections import OrderedDict
+from itertools import groupby
+
+import qrcode
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+from .cpu_pool import pool
+
+# Rendering parameters; part of the cache key so changing them
+# never serves an image rendered with the old settings.
+QR_VERSION = 1
+QR_BOX_SIZE = 10
+QR_BORDER = 5
+
+# Mask pattern of the SVG and matrix formats. Picking the best of the
+# eight masks, as the PNG render does, builds and scores all of them and is
+# most of the render's cost. Every mask gives a standard code; the mask in
+# use is part of the code's format information, which scanners read first.
+COMPACT_MASK_PATTERN = 2
+
+# Format: (cache file extension, content type)
+QR_FORMATS = {
+    'png': ('png', 'image/png'),
+    'svg': ('svg', 'image/svg+xml'),
+    'matrix': ('bin', 'application/octet-stream'),
+}
+
+# Prune the disk cache once every this many writes
+DISK_PRUNE_INTERVAL = 64
+
+if settings.TICKET_QR_FORMAT not in QR_FORMATS:
+    raise ImproperlyConfigured(
+        f"TICKET_QR_FORMAT must be one of {', '.join(QR_FORMATS)}, not {settings.TICKET_QR_FORMAT!r}"
+    )
+
+
+def build_qr(data, mask_pattern=None):
+    qr = qrcode.QRCode(version=QR_VERSION, box_size=QR_BOX_SIZE, border=QR_BORDER, mask_pattern=mask_pattern)
+    qr.add_data(data)
+    qr.make(fit=True)
+    return qr
+
+
+def render_qr_png(data):
+    """
+    Render QR code data to PNG bytes
+    """
+    img = build_qr(data).make_image(fill_color="black", back_color="white")
+    buffer = io.BytesIO()
+    img.save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def render_qr_svg(data):
+    """
+    Render QR code data to SVG bytes: one path of the dark runs in each
+    row, in units of one module
+    """
+    modules = build_qr(data, COMPACT_MASK_PATTERN).modules
+    size = len(modules) + 2 * QR_BORDER
+    path = []
+    for y, row in enumerate(modules, QR_BORDER):
+        x = QR_BORDER
+        for dark, run in groupby(row):
+            length = len(list(run))
+            if dark:
+                path.append(f"M{x} {y}h{length}v1h-{length}z")
+            x += length
+    return (
+        f'<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 {size} {size}" shape-rendering="crispEdges">'
+        f'<rect width="{size}" height="{size}" fill="#fff"/><path d="{"".join(path)}"/></svg>'
+    ).encode()
+
+
+def render_qr_matrix(data):
+    """
+    Pack QR code data's modules for the ticket page to draw: one byte for
+    the side in modules, then the rows' bits, most significant bit first
+    """
+    modules = build_qr(data, COMPACT_MASK_PATTERN).modules
+    bits = ''.join('1' if dark else '0' for row in modules for dark in row)
+    bits += '0' * (-len(bits) % 8)
+    return bytes([len(modules)]) + int(bits, 2).to_bytes(len(bits) // 8, 'big')
+
+
+RENDERERS = {
+    'png': render_qr_png,
+    'svg': render_qr_svg,
+    'matrix': render_qr_matrix,
+}
+
+
+def generate_qr_code(data, image_format='png'):
+    """
+    Generate QR code for order, base64 encoded, in one of QR_FORMATS
+    """
+    return base64.b64encode(RENDERERS[image_format](data)).decode()
+
+
+def qr_digest(data, image_format='png'):
+    """
+    Stable digest of a payload and the parameters it is rendered with
+    """
+    key = f"{QR_VERSION}:{QR_BOX_SIZE}:{QR_BORDER}:{data}"
+    if image_format != 'png':
+        # PNG keys predate the other formats and are kept, so cached PNGs stay valid
+        key = f"{image_format}:{COMPACT_MASK_PATTERN}:{key}"
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+class QRImageCache:
+    """
+    Two-level LRU cache of rendered QR images keyed by payload digest and
+    file extension
+    """
+
+    def __init__(self, directory, memory_items, disk_items):
+        self.directory = directory
+        self.memory_items = memory_items
+        self.disk_items = disk_items
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._writes = 0
+
+    def _path(self, key):
+        return os.path.join(self.directory, key)
+
+    def _remember(self, key, image):
+        with self._lock:
+            self._memory[key] = image
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_items:
+                self._memory.popitem(last=False)
+
+    def _read_disk(self, key):
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                image = f.read()
+        except OSError:
+            return None
+        # Touch the file so pruning evicts the least recently used images
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return image
+
+    def _write_disk(self, key, image):
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            # Write then rename so readers never see a partial file
+            tmp_path = f"{self._path(key)}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(image)
+            os.replace(tmp_path, self._path(key))
+        except OSError:
+            return
+
+        with self._lock:
+            self._writes += 1
+            prune = self._writes % DISK_PRUNE_INTERVAL == 0
+        if prune:
+            self.prune_disk()
+
+    def prune_disk(self):
+        """
+        Delete the least recently used images beyond the disk limit
+        """
+        try:
+            entries = [
+                entry for entry in os.scandir(self.directory)
+                if not entry.name.endswith('.tmp')
+            ]
+        except OSError:
+            return
+        if len(entries) <= self.disk_items:
+            return
+
+        entries.sort(key=lambda entry: entry.stat().st_mtime)
+        for entry in entries[:len(entries) - self.disk_items]:
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
+
+    def get(self, key):
+        with self._lock:
+            image = self._memory.get(key)
+            if image is not None:
+                self._memory.move_to_end(key)
+                return image
+
+        image = self._read_disk(key)
+        if image is not None:
+            self._remember(key, image)
+        return image
+
+    def set(self, key, image):
+        self._remember(key, image)
+        self._write_disk(key, image)
+
+    def clear_memory(self):
+        with self._lock:
+            self._memory.clear()
+
+
+qr_image_cache = QRImageCache(
+    directory=settings.QR_CACHE_DIR,
+    memory_items=settings.QR_CACHE_MEMORY_ITEMS,
+    disk_items=settings.QR_CACHE_DISK_ITEMS,
+)
+
+
+def get_qr_image(data, image_format='png'):
+    """
+    Return (digest, image bytes) for QR data, rendering on a cache miss
+    """
+    digest = qr_digest(data, image_format)
+    key = f"{digest}.{QR_FORMATS[image_format][0]}"
+    image = qr_image_cache.get(key)
+    if image is None:
+        image = pool.run('qr_render', RENDERERS[image_format], data)
+        qr_image_cache.set(key, image)
+    return digest, image
@@ -0,0 +1,202 @@
+"""
+Slow-query log and N+1 detector for development and staging.
+
+With QUERY_INSPECTOR on, every query a request runs is recorded with its
+time and the line of project code that ran it. After the response, the
+request's report is logged, listing:
+
+- queries slower than SLOW_QUERY_MS;
+- query shapes run N_PLUS_ONE_THRESHOLD or more times, which usually means
+  a loop fetching a relation row by row;
+- the view's query count if it exceeds its entry in QUERY_BUDGETS.
+
+With QUERY_BUDGET_STRICT on, a view over budget raises
+QueryBudgetExceeded instead, which fails the test that requested it.
+
+The recorder is an execute wrapper installed on each database connection
+as it opens. The request is found through a context variable, so queries
+that async views run on sync_to_async threads are recorded too.
+"""
+import logging
+import re
+import sys
+import time
+from collections import defaultdict
+from contextvars import ContextVar
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+from . import metrics
+from .metrics import current_request_id
+
+logger = logging.getLogger(__name__)
+
+# "IN (%s, %s, %s)" and "IN (%s)" are the same shape
+IN_LIST = re.compile(r'\(\s*%s(?:\s*,\s*%s)*\s*\)')
+
+# Longest SQL shown in a report line
+SQL_PREVIEW = 300
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+class QueryLog:
+    """
+    Queries run while handling one request
+    """
+
+    def __init__(self):
+        self.queries = []
+
+    def add(self, sql, duration, call_site):
+        self.queries.append((sql, duration, call_site))
+
+    @property
+    def total_duration(self):
+        return sum(duration for _, duration, _ in self.queries)
+
+    def slow_queries(self, threshold_ms):
+        return [query for query in self.queries if query[1] * 1000 >= threshold_ms]
+
+    def repeated_shapes(self, threshold):
+        """
+        [(shape, count, call sites)] for shapes run at least threshold times
+        """
+        shapes = defaultdict(list)
+        for sql, _, call_site in self.queries:
+            shapes[query_shape(sql)].append(call_site)
+        return [
+            (shape, len(call_sites), sorted(set(call_sites)))
+            for shape, call_sites in shapes.items()
+            if len(call_sites) >= threshold
+        ]
+
+
+_query_log = ContextVar('query_log', default=None)
+
+_project_dir = str(Path(settings.BASE_DIR).resolve())
+# Execute wrappers, which sit between the query and the code that ran it
+_wrapper_files = {__file__, metrics.__file__}
+
+
+def query_shape(sql):
+    return IN_LIST.sub('(...)', sql)
+
+
+def call_site():
+    """
+    The innermost frame of project code below the query, as 'path:line in function'
+    """
+    frame = sys._getframe(2)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if (
+            filename.startswith(_project_dir)
+            and filename not in _wrapper_files
+            and 'site-packages' not in filename
+        ):
+            return f'{Path(filename).relative_to(_project_dir)}:{frame.f_lineno} in {frame.f_code.co_name}'
+        frame = frame.f_back
+    return 'unknown'
+
+
+def record_query(execute, sql, params, many, context):
+    log = _query_log.get()
+    if log is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        log.add(sql, time.perf_counter() - start, call_site())
+
+
+def install_query_recorder(sender, connection, **kwargs):
+    """
+    connection_created receiver adding the recorder to new connections
+    """
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+def preview(sql):
+    sql = ' '.join(sql.split())
+    return sql if len(sql) <= SQL_PREVIEW else sql[:SQL_PREVIEW] + '...'
+
+
+def build_report(request, response, log):
+    """
+    (report text, whether anything was flagged, query budget if exceeded)
+    """
+    match = request.resolver_match
+    view = match.view_name if match else None
+    lines = [
+        f'{request.method} {request.path} -> {response.status_code}: '
+        f'{len(log.queries)} queries in {log.total_duration * 1000:.1f} ms '
+        f'[request {current_request_id()}]'
+    ]
+
+    slow = log.slow_queries(settings.SLOW_QUERY_MS)
+    for sql, duration, site in slow:
+        lines.append(f'  slow query, {duration * 1000:.1f} ms at {site}: {preview(sql)}')
+
+    repeated = log.repeated_shapes(settings.N_PLUS_ONE_THRESHOLD)
+    for shape, count, sites in repeated:
+        lines.append(f'  N+1: {count} x at {", ".join(sites)}: {preview(shape)}')
+
+    budget = settings.QUERY_BUDGETS.get(view)
+    over_budget = budget is not None and len(log.queries) > budget
+    if over_budget:
+        lines.append(f'  over budget: {len(log.queries)} queries, budget for {view} is {budget}')
+
+    return '\n'.join(lines), bool(slow or repeated or over_budget), budget if over_budget else None
+
+
+class QueryInspectorMiddleware:
+    """
+    Logs each request's query report. Removes itself unless QUERY_INSPECTOR
+    is on; put it near the top of MIDDLEWARE so session and user lookups
+    are included.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.QUERY_INSPECTOR:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        log = QueryLog()
+        token = _query_log.set(log)
+        try:
+            response = self.get_response(request)
+        finally:
+            _query_log.reset(token)
+        return self.report(request, response, log)
+
+    async def __acall__(self, request):
+        log = QueryLog()
+        token = _query_log.set(log)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _query_log.reset(token)
+        return self.report(request, response, log)
+
+    def report(self, request, response, log):
+        text, flagged, exceeded_budget = build_report(request, response, log)
+        if exceeded_budget is not None and settings.QUERY_BUDGET_STRICT:
+            raise QueryBudgetExceeded(text)
+        logger.log(logging.WARNING if flagged else logging.DEBUG, text)
+        return response
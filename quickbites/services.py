@@ -0,0 +1,311 @@
+"""
+Order workflows shared by the views
+"""
+from datetime import datetime, timezone as dt_timezone
+from decimal import Decimal
+
+from asgiref.sync import sync_to_async
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import Cart, CartItem, Order, OrderItem
+from .order_events import publish_orders, publish_orders_on_commit
+
+# Largest number of scans accepted in one batch redemption
+MAX_BATCH_SCANS = 500
+
+
+class EmptyCartError(Exception):
+    """
+    Raised when checking out a cart with no items
+    """
+
+
+def order_qr_payload(order_id, uprn):
+    """
+    Data encoded in an order's ticket QR code
+    """
+    return f"ORDER:{order_id}:{uprn}"
+
+
+def _line_total():
+    return ExpressionWrapper(
+        F('quantity') * F('menu_item__price'),
+        output_field=DecimalField(max_digits=8, decimal_places=2)
+    )
+
+
+def recalculate_cart_totals(carts):
+    """
+    Recompute item_count and total_amount from the cart items for every cart
+    in a queryset, in a single UPDATE. Returns the number of carts updated.
+    """
+    lines = CartItem.objects.filter(cart=OuterRef('pk')).order_by().values('cart')
+    return carts.update(
+        item_count=Coalesce(Subquery(lines.annotate(count=Count('pk')).values('count')), 0),
+        total_amount=Coalesce(
+            Subquery(lines.annotate(total=Sum(_line_total())).values('total')),
+            Decimal('0'),
+            output_field=DecimalField(max_digits=8, decimal_places=2)
+        ),
+    )
+
+
+def add_cart_item(user, menu_item):
+    """
+    Add one of a menu item to the user's cart.
+    Returns the cart with up to date item_count and total_amount.
+    """
+    with transaction.atomic():
+        cart, created = Cart.objects.get_or_create(user=user)
+        
+        # Bump an existing line in place; F() keeps concurrent adds from losing updates
+        updated = CartItem.objects.filter(cart=cart, menu_item=menu_item).update(
+            quantity=F('quantity') + 1
+        )
+        if updated:
+            Cart.objects.filter(pk=cart.pk).update(
+                total_amount=F('total_amount') + menu_item.price * updated,
+                updated_at=timezone.now()
+            )
+        else:
+            CartItem.objects.create(cart=cart, menu_item=menu_item, quantity=1)
+            Cart.objects.filter(pk=cart.pk).update(
+                item_count=F('item_count') + 1,
+                total_amount=F('total_amount') + menu_item.price,
+                updated_at=timezone.now()
+            )
+        
+        cart.refresh_from_db(fields=['item_count', 'total_amount'])
+    return cart
+
+
+def set_cart_item_quantity(user, item_id, quantity):
+    """
+    Set the quantity of a line in the user's cart, removing it when the
+    quantity drops to zero. Returns (cart, line subtotal).
+    Raises CartItem.DoesNotExist if the line is not in the user's cart.
+    """
+    with transaction.atomic():
+        cart_item = (
+            CartItem.objects.select_for_update()
+            .select_related('menu_item')
+            .get(cart__user=user, id=item_id)
+        )
+        price = cart_item.menu_item.price
+        
+        if quantity > 0:
+            CartItem.objects.filter(pk=cart_item.pk).update(quantity=quantity)
+            Cart.objects.filter(pk=cart_item.cart_id).update(
+                total_amount=F('total_amount') + price * (quantity - cart_item.quantity),
+                updated_at=timezone.now()
+            )
+            subtotal = price * quantity
+        else:
+            CartItem.objects.filter(pk=cart_item.pk).delete()
+            Cart.objects.filter(pk=cart_item.cart_id).update(
+                item_count=Greatest(F('item_count') - 1, 0),
+                total_amount=F('total_amount') - price * cart_item.quantity,
+                updated_at=timezone.now()
+            )
+            subtotal = 0
+        
+        cart = Cart.objects.only('item_count', 'total_amount').get(pk=cart_item.cart_id)
+    return cart, subtotal
+
+
+def remove_cart_item(user, item_id):
+    """
+    Remove a line from the user's cart. Returns the updated cart.
+    Raises CartItem.DoesNotExist if the line is not in the user's cart.
+    """
+    return set_cart_item_quantity(user, item_id, 0)[0]
+
+
+def create_order(user, cart_items):
+    """
+    Write a confirmed order and its lines for a list of cart items, which
+    only need menu_item and quantity set. The order is inserted once and
+    its lines in one bulk insert; call inside a transaction.
+    """
+    order = Order(
+        user=user,
+        total_amount=sum(item.get_subtotal() for item in cart_items),
+        status='confirmed',
+    )
+    # Only the payload is stored; the ticket image is rendered on demand
+    order.qr_code = order_qr_payload(order.id, user.uprn)
+    order.save(force_insert=True)
+
+    OrderItem.objects.bulk_create([
+        OrderItem(
+            order=order,
+            menu_item=cart_item.menu_item,
+            quantity=cart_item.quantity,
+            price=cart_item.menu_item.price
+        )
+        for cart_item in cart_items
+    ])
+    return order
+
+
+def place_order(user):
+    """
+    Turn the user's cart into a confirmed order in a single transaction.
+
+    The cart and its menu items are read in one join and the order lines are
+    written with one bulk insert, so the number of queries does not grow with
+    the size of the cart.
+    """
+    with transaction.atomic():
+        cart_items = list(
+            CartItem.objects.filter(cart__user=user).select_related('menu_item')
+        )
+        if not cart_items:
+            raise EmptyCartError()
+
+        order = create_order(user, cart_items)
+
+        # Clear cart
+        Cart.objects.filter(user=user).delete()
+
+    return order
+
+
+def parse_order_qr_payload(qr_data):
+    """
+    Split "ORDER:order_id:uprn" into (order_id, uprn), or return None
+    """
+    if qr_data.startswith('ORDER:'):
+        parts = qr_data.split(':')
+        if len(parts) == 3:
+            return parts[1], parts[2]
+    return None
+
+
+def redeem_ticket(qr_data, redeemed_at=None, publish=True):
+    """
+    Redeem the ticket encoded in a scanned QR payload.
+
+    Redemption is a single conditional UPDATE on unredeemed orders, so when
+    several scanners present the same ticket at once exactly one of them
+    succeeds. Returns the result as a JSON-serialisable dict. Pass
+    publish=False to leave publishing the change to the caller.
+    """
+    parsed = parse_order_qr_payload(qr_data)
+    if parsed is None:
+        return {'success': False, 'message': 'Invalid QR code'}
+    order_id, uprn = parsed
+
+    try:
+        ticket = Order.objects.filter(id=order_id, user__uprn=uprn)
+        redeemed = ticket.filter(is_redeemed=False).update(**_redeemed_fields(redeemed_at))
+        order = ticket.values('id', 'user__name', 'total_amount').first()
+    except ValidationError:
+        # Malformed order id
+        return {'success': False, 'message': 'Invalid QR code'}
+
+    # update() sends no signals, so tell the live order streams directly
+    if redeemed and publish:
+        publish_orders_on_commit([order['id']])
+
+    return _redemption_result(order_id, order, redeemed)
+
+
+async def aredeem_ticket(qr_data):
+    """
+    Async version of redeem_ticket for async views. Each query runs on its
+    own, which is safe because the redemption is a single UPDATE.
+    """
+    parsed = parse_order_qr_payload(qr_data)
+    if parsed is None:
+        return {'success': False, 'message': 'Invalid QR code'}
+    order_id, uprn = parsed
+
+    try:
+        ticket = Order.objects.filter(id=order_id, user__uprn=uprn)
+        redeemed = await ticket.filter(is_redeemed=False).aupdate(**_redeemed_fields(None))
+        order = await ticket.values('id', 'user__name', 'total_amount').afirst()
+    except ValidationError:
+        # Malformed order id
+        return {'success': False, 'message': 'Invalid QR code'}
+
+    if redeemed:
+        await sync_to_async(publish_orders)([order['id']])
+
+    return _redemption_result(order_id, order, redeemed)
+
+
+def _redeemed_fields(redeemed_at):
+    return {
+        'is_redeemed': True,
+        'redeemed_at': redeemed_at or timezone.now(),
+        'status': 'completed',
+    }
+
+
+def _redemption_result(order_id, order, redeemed):
+    if order is None:
+        return {'success': False, 'message': 'Order not found'}
+    if not redeemed:
+        return {'success': False, 'message': 'Ticket already redeemed'}
+
+    return {
+        'success': True,
+        'message': f'Order {order_id} redeemed successfully',
+        'customer_name': order['user__name'],
+        'total_amount': str(order['total_amount'])
+    }
+
+
+def parse_scanned_at(value):
+    """
+    Parse a client scan timestamp (epoch milliseconds or ISO 8601).
+    Missing, malformed or future timestamps fall back to now.
+    """
+    now = timezone.now()
+    scanned_at = None
+    try:
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            scanned_at = datetime.fromtimestamp(value / 1000, tz=dt_timezone.utc)
+        elif isinstance(value, str):
+            scanned_at = parse_datetime(value)
+            if scanned_at is not None and timezone.is_naive(scanned_at):
+                scanned_at = timezone.make_aware(scanned_at)
+    except (ValueError, OverflowError, OSError):
+        scanned_at = None
+
+    if scanned_at is None or scanned_at > now:
+        return now
+    return scanned_at
+
+
+def redeem_tickets(scans):
+    """
+    Redeem a batch of buffered scans in one transaction.
+
+    Each scan is a dict with 'qr_data' and an optional client 'scanned_at',
+    which is recorded as the redemption time. Results are returned in the
+    same order as the scans.
+    """
+    results = []
+    redeemed_ids = []
+    with transaction.atomic():
+        for scan in scans:
+            qr_data = str(scan.get('qr_data', ''))
+            result = redeem_ticket(
+                qr_data,
+                redeemed_at=parse_scanned_at(scan.get('scanned_at')),
+                publish=False
+            )
+            if result['success']:
+                redeemed_ids.append(parse_order_qr_payload(qr_data)[0])
+            result['qr_data'] = qr_data
+            results.append(result)
+        # One publish for the whole batch
+        publish_orders_on_commit(redeemed_ids)
+    return results
@@ -5,6 +5,7 @@ Django settings for quickbites project.
 import os
 from pathlib import Path
 from dotenv import load_dotenv
+from quickbites.db_profiles import sqlite_options
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -31,6 +32,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'quickbites.metrics.RequestMetricsMiddleware',
+    'quickbites.query_inspector.QueryInspectorMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -59,16 +62,118 @@ TEMPLATES = [
 ]
 
 # Database
+# SQLite profile: 'tuned' (WAL, immediate write transactions, busy timeout)
+# or 'default'. Tuned unless running with DEBUG.
+QUICKBITES_DB_PROFILE = os.getenv('QUICKBITES_DB_PROFILE', 'default' if DEBUG else 'tuned')
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'NAME': os.getenv('QUICKBITES_DB_PATH', BASE_DIR / 'db.sqlite3'),
+        'OPTIONS': sqlite_options(QUICKBITES_DB_PROFILE),
+    }
+}
+
+# Cache
+# Local memory is per process; point QUICKBITES_CACHE_BACKEND at a shared
+# backend when running more than one worker so menu edits reach all of them.
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('QUICKBITES_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('QUICKBITES_CACHE_LOCATION', 'quickbites'),
     }
 }
 
+# Seconds a menu snapshot may be served before it is rebuilt. Edits bump the
+# menu version immediately; this only bounds staleness across processes.
+MENU_CACHE_TIMEOUT = int(os.getenv('QUICKBITES_MENU_CACHE_TIMEOUT', '300'))
+
+# Cart storage: 'quickbites.cart.DatabaseCart' (Cart/CartItem tables) or
+# 'quickbites.cart.CacheCart' (Django cache; database touched only at checkout)
+CART_BACKEND = os.getenv('QUICKBITES_CART_BACKEND', 'quickbites.cart.DatabaseCart')
+CART_CACHE_TIMEOUT = int(os.getenv('QUICKBITES_CART_CACHE_TIMEOUT', str(60 * 60 * 24)))
+
+# Orders per page in the profile order history
+PROFILE_ORDERS_PAGE_SIZE = 20
+
+# Live order streams: events buffered per connected client before it must
+# resync, and seconds between keepalives on an idle stream
+ORDER_EVENTS_QUEUE_SIZE = 100
+ORDER_EVENTS_KEEPALIVE = 15
+# Set in processes that change orders but serve no streams, to forward their
+# changes to the main app's order events endpoint
+ORDER_EVENTS_FORWARD_URL = None
+# Shared secret the order events endpoint requires as a bearer token; the
+# endpoint refuses every request while it is unset (serve.py sets one)
+ORDER_EVENTS_TOKEN = os.getenv('QUICKBITES_ORDER_EVENTS_TOKEN')
+
+# Directory where worker processes exchange order events; set by serve.py
+# when running more than one worker
+ORDER_EVENTS_BUS_DIR = os.getenv('QUICKBITES_EVENTS_BUS_DIR')
+
+# Request metrics at /metrics/: directory where worker processes share
+# them (set by serve.py), and a bearer token that lets a scraper in
+METRICS_DIR = os.getenv('QUICKBITES_METRICS_DIR')
+METRICS_TOKEN = os.getenv('QUICKBITES_METRICS_TOKEN')
+
+# Development/staging query inspector: logs slow queries and repeated query
+# shapes (N+1) with the code that ran them, and views over their budget
+QUERY_INSPECTOR = os.getenv('QUICKBITES_QUERY_INSPECTOR', 'False') == 'True'
+SLOW_QUERY_MS = float(os.getenv('QUICKBITES_SLOW_QUERY_MS', '100'))
+# Runs of one query shape in a request that count as an N+1
+N_PLUS_ONE_THRESHOLD = int(os.getenv('QUICKBITES_N_PLUS_ONE_THRESHOLD', '3'))
+# Most queries per request by view name, session and user lookups included
+QUERY_BUDGETS = {
+    'menu': 4,
+    'cart': 3,
+    'get_cart_count': 3,
+    'add_to_cart': 12,
+    'payment': 3,
+    'payment_success': 3,
+    'profile': 4,
+    'profile_orders': 4,
+    'ticket': 4,
+}
+# Raise instead of logging when a view exceeds its budget, to fail tests
+QUERY_BUDGET_STRICT = os.getenv('QUICKBITES_QUERY_BUDGET_STRICT', 'False') == 'True'
+
+# Ticket QR images, rendered on demand and cached in memory and on disk
+QR_CACHE_DIR = os.getenv('QUICKBITES_QR_CACHE_DIR', os.path.join(BASE_DIR, 'qr_cache'))
+QR_CACHE_MEMORY_ITEMS = int(os.getenv('QUICKBITES_QR_CACHE_MEMORY_ITEMS', '256'))
+QR_CACHE_DISK_ITEMS = int(os.getenv('QUICKBITES_QR_CACHE_DISK_ITEMS', '5000'))
+# How the ticket page shows its QR code: 'png', 'svg' or 'matrix' (drawn to a canvas)
+TICKET_QR_FORMAT = os.getenv('QUICKBITES_TICKET_QR_FORMAT', 'png')
+# Render each new ticket's QR code in the background after checkout, so it
+# is cached before the ticket is opened; tickets beyond the queue size are
+# rendered on demand instead
+QR_PRERENDER = os.getenv('QUICKBITES_QR_PRERENDER', 'True') == 'True'
+QR_PRERENDER_THREADS = int(os.getenv('QUICKBITES_QR_PRERENDER_THREADS', '1'))
+QR_PRERENDER_QUEUE_SIZE = int(os.getenv('QUICKBITES_QR_PRERENDER_QUEUE_SIZE', '256'))
+
+# Processes that render QR codes and hash passwords (0 runs them in the
+# request's thread); see quickbites/cpu_pool.py. Each worker process starts
+# its own pool, so size it per worker: serve.py sets the CPU count divided
+# by --workers. Off by default, as a pool adds processes to runserver,
+# management commands and scripts, where it does not pay for itself.
+CPU_POOL_WORKERS = int(os.getenv('QUICKBITES_CPU_POOL_WORKERS', '0'))
+# Tasks queued or running beyond this, or not yet started by a process
+# after the timeout, run in the request's thread instead
+CPU_POOL_MAX_PENDING = int(os.getenv('QUICKBITES_CPU_POOL_MAX_PENDING', '8'))
+CPU_POOL_TIMEOUT = float(os.getenv('QUICKBITES_CPU_POOL_TIMEOUT', '5.0'))
+
 # Custom User Model
 AUTH_USER_MODEL = 'quickbites.User'
 
+# Django's default list, with its PBKDF2 hasher replaced by one that hashes
+# in the CPU pool
+PASSWORD_HASHERS = [
+    'quickbites.hashers.PooledPBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+]
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
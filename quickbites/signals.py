@@ -0,0 +1,59 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, pre_delete
+from django.dispatch import receiver
+
+from .menu_cache import bump_menu_version
+from .models import Cart, CartItem, MenuItem, MenuSection, Order
+from .order_events import publish_orders_on_commit
+from .services import recalculate_cart_totals
+
+
+@receiver(post_save, sender=MenuItem)
+@receiver(post_delete, sender=MenuItem)
+@receiver(post_save, sender=MenuSection)
+@receiver(post_delete, sender=MenuSection)
+def invalidate_menu_cache(sender, **kwargs):
+    """
+    Bump the menu version once the change is committed
+    """
+    transaction.on_commit(bump_menu_version)
+
+
+@receiver(post_save, sender=MenuItem)
+def refresh_cart_totals_on_price_change(sender, instance, created, update_fields=None, **kwargs):
+    """
+    Keep cart totals in step with a menu item's current price, once the
+    change is committed. Saves that leave the price alone touch no carts.
+    """
+    if created or (update_fields is not None and 'price' not in update_fields):
+        return
+    loaded_price = getattr(instance, '_loaded_price', None)
+    if loaded_price is not None and loaded_price == instance.price:
+        return
+    instance._loaded_price = instance.price
+    menu_item_id = instance.pk
+    transaction.on_commit(
+        lambda: recalculate_cart_totals(Cart.objects.filter(cartitem__menu_item_id=menu_item_id))
+    )
+
+
+@receiver(pre_delete, sender=MenuItem)
+def refresh_cart_totals_on_delete(sender, instance, **kwargs):
+    """
+    Recount carts that lose a line when a menu item is deleted
+    """
+    cart_ids = list(
+        CartItem.objects.filter(menu_item=instance).values_list('cart_id', flat=True).distinct()
+    )
+    if cart_ids:
+        transaction.on_commit(
+            lambda: recalculate_cart_totals(Cart.objects.filter(pk__in=cart_ids))
+        )
+
+
+@receiver(post_save, sender=Order)
+def publish_order_change(sender, instance, **kwargs):
+    """
+    Push new orders and status edits to the live order streams
+    """
+    publish_orders_on_commit([instance.pk])
@@ -0,0 +1,182 @@
+"""
+ASGI front end for the live order streams.
+
+Django's ASGI handler runs sync middleware on a thread of its own for each
+request and keeps that thread until the response ends, so a stream served
+through it holds a thread for as long as the client stays connected.
+
+EventStreamApp answers requests for the stream URLs itself. It loads the
+session and user with Django's async APIs and writes events straight to
+the connection, so an idle client costs a coroutine and nothing else.
+Every other request goes to Django unchanged.
+
+As these requests skip Django's middleware, EventStreamApp does the parts
+that matter for a stream itself: it rejects hosts not in ALLOWED_HOSTS,
+sends the SecurityMiddleware headers, and records the time to open the
+stream in the request metrics.
+"""
+import asyncio
+import io
+import logging
+import time
+from importlib import import_module
+
+from django.conf import settings
+from django.contrib.auth import aget_user
+from django.core.exceptions import DisallowedHost, PermissionDenied
+from django.core.handlers.asgi import ASGIRequest
+from django.urls import Resolver404, resolve
+
+from .metrics import REQUEST_ID_HEADER, RequestMetricsMiddleware, registry
+from .models import Order
+from .order_events import kitchen_events, order_status_events
+
+logger = logging.getLogger(__name__)
+security_logger = logging.getLogger('django.security.DisallowedHost')
+
+
+def security_headers():
+    """
+    The headers SecurityMiddleware and XFrameOptionsMiddleware add to every
+    response, from the same settings
+    """
+    headers = []
+    if settings.SECURE_CONTENT_TYPE_NOSNIFF:
+        headers.append((b'x-content-type-options', b'nosniff'))
+    if settings.SECURE_REFERRER_POLICY:
+        policy = settings.SECURE_REFERRER_POLICY
+        if not isinstance(policy, str):
+            policy = ','.join(policy)
+        headers.append((b'referrer-policy', policy.encode()))
+    if settings.SECURE_CROSS_ORIGIN_OPENER_POLICY:
+        headers.append((b'cross-origin-opener-policy', settings.SECURE_CROSS_ORIGIN_OPENER_POLICY.encode()))
+    headers.append((b'x-frame-options', getattr(settings, 'X_FRAME_OPTIONS', 'DENY').upper().encode()))
+    return headers
+
+
+def hsts_header():
+    value = f'max-age={settings.SECURE_HSTS_SECONDS}'
+    if settings.SECURE_HSTS_INCLUDE_SUBDOMAINS:
+        value += '; includeSubDomains'
+    if settings.SECURE_HSTS_PRELOAD:
+        value += '; preload'
+    return (b'strict-transport-security', value.encode())
+
+
+STREAM_HEADERS = [
+    (b'content-type', b'text/event-stream'),
+    (b'cache-control', b'no-cache'),
+    # Stop reverse proxies from buffering the stream
+    (b'x-accel-buffering', b'no'),
+    *security_headers(),
+]
+
+
+async def open_stream(url_name, user, kwargs):
+    """
+    The event stream for a stream URL, or None if the URL is not a stream
+    """
+    if url_name == 'kitchen_stream':
+        return await kitchen_events(user)
+    if url_name == 'order_status_stream':
+        return await order_status_events(user, kwargs['order_id'])
+    return None
+
+
+class EventStreamApp:
+    """
+    ASGI application serving the stream URLs and passing the rest to Django
+    """
+
+    def __init__(self, django_app):
+        self.django_app = django_app
+        # Only its request ID and query counting are used, not the middleware chain
+        self.metrics = RequestMetricsMiddleware(None)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'http' and scope['method'] == 'GET':
+            try:
+                match = resolve(scope['path'])
+            except Resolver404:
+                match = None
+            if match is not None and match.url_name in ('kitchen_stream', 'order_status_stream'):
+                await self.stream(match, scope, receive, send)
+                return
+        await self.django_app(scope, receive, send)
+
+    async def load_user(self, request):
+        engine = import_module(settings.SESSION_ENGINE)
+        request.session = engine.SessionStore(request.COOKIES.get(settings.SESSION_COOKIE_NAME))
+        return await aget_user(request)
+
+    async def open(self, request, match):
+        """
+        (status, event stream); the stream is None unless status is 200
+        """
+        try:
+            request.get_host()
+        except DisallowedHost as e:
+            security_logger.error(str(e))
+            return 400, None
+        user = await self.load_user(request)
+        try:
+            return 200, await open_stream(match.url_name, user, match.kwargs)
+        except PermissionDenied:
+            return 403, None
+        except Order.DoesNotExist:
+            return 404, None
+
+    async def stream(self, match, scope, receive, send):
+        request = ASGIRequest(scope, io.BytesIO())
+        stats, tokens = self.metrics.start(request)
+        try:
+            status, events = await self.open(request, match)
+        finally:
+            self.metrics.reset(tokens)
+        # Only the time to open the stream; how long a client then stays is not a request time
+        registry.observe(
+            match.view_name, status, time.perf_counter() - request._metrics_start,
+            stats.queries, stats.db_duration, None
+        )
+
+        headers = [(REQUEST_ID_HEADER.lower().encode(), request.request_id.encode())]
+        if settings.SECURE_HSTS_SECONDS and request.is_secure():
+            headers.append(hsts_header())
+        if events is None:
+            await self.error(send, status, headers)
+            return
+
+        await send({'type': 'http.response.start', 'status': 200, 'headers': STREAM_HEADERS + headers})
+
+        async def write():
+            async for message in events:
+                await send({'type': 'http.response.body', 'body': message.encode(), 'more_body': True})
+
+        async def wait_for_disconnect():
+            while (await receive())['type'] != 'http.disconnect':
+                pass
+
+        writer = asyncio.ensure_future(write())
+        disconnect = asyncio.ensure_future(wait_for_disconnect())
+        try:
+            await asyncio.wait([writer, disconnect], return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in (writer, disconnect):
+                task.cancel()
+            await asyncio.gather(writer, disconnect, return_exceptions=True)
+            if not writer.cancelled() and writer.exception() is not None:
+                logger.error(
+                    'Event stream %s failed [request %s]', request.path, request.request_id,
+                    exc_info=writer.exception()
+                )
+            # Unsubscribes from the broker
+            await events.aclose()
+            # Ends the response; ignored by the server if the client has gone
+            await send({'type': 'http.response.body', 'body': b'', 'more_body': False})
+
+    async def error(self, send, status, headers):
+        await send({
+            'type': 'http.response.start', 'status': status,
+            'headers': [(b'content-type', b'text/plain'), *security_headers(), *headers],
+        })
+        await send({'type': 'http.response.body', 'body': b'', 'more_body': False})
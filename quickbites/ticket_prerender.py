@@ -0,0 +1,100 @@
+"""
+Renders new tickets' QR codes in the background.
+
+Once a checkout commits, the order's QR payload is queued, and worker
+threads render it into the QR image cache in TICKET_QR_FORMAT. The image is
+then usually cached before the student opens the ticket, and checkout
+itself does no image work.
+
+The queue holds QR_PRERENDER_QUEUE_SIZE tickets. When it is full a new
+ticket is not queued and is rendered on demand when first viewed, as it
+is without pre-rendering; checkout never waits for the queue. Each ticket's
+wait in the queue, render time and outcome (rendered, failed, dropped) are
+recorded in the request metrics as the 'qr_prerender' task.
+"""
+import logging
+import os
+import queue
+import threading
+import time
+
+from django.conf import settings
+from django.db import transaction
+
+from .metrics import registry
+from .qr import get_qr_image
+
+logger = logging.getLogger(__name__)
+
+TASK = 'qr_prerender'
+
+
+class TicketPrerenderer:
+    """
+    Bounded queue of QR payloads and the threads that render them. The
+    threads start with the first ticket in each process, so workers forked
+    from a preloading master start their own.
+    """
+
+    def __init__(self, threads, queue_size):
+        self.threads = threads
+        self._queue = queue.Queue(queue_size)
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _start(self):
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            # Entries queued before a fork belong to the parent
+            self._queue = queue.Queue(self._queue.maxsize)
+            for i in range(self.threads):
+                threading.Thread(target=self._run, name=f'qr-prerender-{i}', daemon=True).start()
+            self._pid = os.getpid()
+
+    def submit(self, qr_data, image_format):
+        """
+        Queue a ticket for rendering; False if the queue is full
+        """
+        self._start()
+        try:
+            self._queue.put_nowait((qr_data, image_format, time.perf_counter()))
+        except queue.Full:
+            registry.observe_task(TASK, 'dropped')
+            logger.debug('QR pre-render queue full; ticket will render on demand')
+            return False
+        return True
+
+    def join(self):
+        """
+        Wait until every queued ticket is rendered
+        """
+        self._queue.join()
+
+    def _run(self):
+        while True:
+            qr_data, image_format, queued_at = self._queue.get()
+            start = time.perf_counter()
+            try:
+                get_qr_image(qr_data, image_format)
+            except Exception:
+                logger.exception('Could not pre-render ticket QR code')
+                outcome = 'failed'
+            else:
+                outcome = 'rendered'
+            registry.observe_task(
+                TASK, outcome, wait=start - queued_at, duration=time.perf_counter() - start
+            )
+            self._queue.task_done()
+
+
+prerenderer = TicketPrerenderer(settings.QR_PRERENDER_THREADS, settings.QR_PRERENDER_QUEUE_SIZE)
+
+
+def prerender_new_ticket(sender, instance, created, **kwargs):
+    """
+    post_save receiver queueing a new order's ticket once it is committed
+    """
+    if created and instance.qr_code:
+        qr_data = instance.qr_code
+        transaction.on_commit(lambda: prerenderer.submit(qr_data, settings.TICKET_QR_FORMAT))
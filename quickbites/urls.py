@@ -1,6 +1,8 @@
 from django.contrib import admin
 from django.urls import path
 from . import views
+from .health import health_check
+from .metrics import metrics_view
 from django.conf import settings
 from django.conf.urls.static import static
 
@@ -30,9 +32,22 @@ urlpatterns = [
     path('payment-success/<uuid:order_id>/', views.payment_success, name='payment_success'),
 
     path('profile/', views.profile_view, name='profile'),
+    path('profile/orders/', views.profile_orders, name='profile_orders'),
     path('ticket/<uuid:order_id>/', views.ticket_view, name='ticket'),
+    path('ticket/<uuid:order_id>/qr.png', views.ticket_qr_image, name='ticket_qr'),
+    path('ticket/<uuid:order_id>/qr.svg', views.ticket_qr_image, {'image_format': 'svg'}, name='ticket_qr_svg'),
+    path('ticket/<uuid:order_id>/status/', views.order_status_stream, name='order_status_stream'),
+
+    path('kitchen/', views.kitchen_view, name='kitchen'),
+    path('kitchen/stream/', views.kitchen_stream, name='kitchen_stream'),
+    path('kitchen/orders/<uuid:order_id>/status/', views.kitchen_update_status, name='kitchen_update_status'),
 
     path('api/redeem-ticket/', views.redeem_ticket, name='redeem_ticket'),
+    path('api/redeem-tickets/', views.redeem_tickets, name='redeem_tickets'),
+    path('api/order-events/', views.order_events, name='order_events'),
+
+    path('healthz/', health_check, name='health_check'),
+    path('metrics/', metrics_view, name='metrics'),
 ]
 
 # --- Add this conditional statement at the end of the file ---
@@ -1,16 +1,32 @@
-from django.shortcuts import render, redirect, get_object_or_404
+from django.shortcuts import render, redirect, get_object_or_404, aget_object_or_404
 from django.contrib.auth import login, logout
 from django.contrib.auth.decorators import login_required
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib import messages
-from django.http import JsonResponse
+from django.http import (
+    HttpResponse, HttpResponseForbidden, HttpResponseNotModified, JsonResponse, Http404,
+    StreamingHttpResponse
+)
 from django.views.decorators.csrf import csrf_exempt
+from django.core.handlers.asgi import ASGIRequest
 from django.utils import timezone
-import json
-import qrcode
-import io
+from django.utils.crypto import constant_time_compare
+from django.utils.dateformat import format as date_format
+from django.urls import reverse
+from django.conf import settings
 import base64
-from .models import User, MenuItem, Cart, CartItem, Order, OrderItem, Feedback, MenuSection
+import json
+from .models import User, MenuItem, CartItem, Order
 from .forms import UserRegistrationForm, UserLoginForm, FeedbackForm
+from .menu_cache import get_menu_snapshot
+from .order_events import (
+    KITCHEN_STATUSES, SNAPSHOT_RETRY_MS, kitchen_events, kitchen_snapshot, order_status_events, publish_orders
+)
+from .order_history import InvalidCursor, order_history_page
+from .qr import QR_BORDER, QR_BOX_SIZE, QR_FORMATS, get_qr_image, qr_digest
+from . import services
+from .cart import get_cart
+from .services import EmptyCartError, order_qr_payload
 
 def splash_screen(request):
     """
@@ -70,21 +86,8 @@ def menu_view(request):
     """
     Menu page showing all available food items
     """
-    # Get active menu sections
-    active_sections = MenuSection.objects.filter(is_active=True).values_list('name', flat=True)
-    
-    # Get menu items for active sections
-    menu_items = MenuItem.objects.filter(
-        is_available=True,
-        category__in=active_sections
-    ).order_by('category', 'name')
-    
-    # Group items by category
-    menu_by_category = {}
-    for item in menu_items:
-        if item.category not in menu_by_category:
-            menu_by_category[item.category] = []
-        menu_by_category[item.category].append(item)
+    # Served from the versioned snapshot; no queries on a cache hit
+    menu_by_category = get_menu_snapshot()['menu_by_category']
     
     return render(request, 'quickbites/menu.html', {
         'menu_by_category': menu_by_category,
@@ -92,28 +95,18 @@ def menu_view(request):
     })
 
 @login_required
-def add_to_cart(request, item_id):
+async def add_to_cart(request, item_id):
     """
     Add item to user's cart
     """
     if request.method == 'POST':
-        menu_item = get_object_or_404(MenuItem, id=item_id)
-        cart, created = Cart.objects.get_or_create(user=request.user)
-        
-        cart_item, created = CartItem.objects.get_or_create(
-            cart=cart,
-            menu_item=menu_item,
-            defaults={'quantity': 1}
-        )
-        
-        if not created:
-            cart_item.quantity += 1
-            cart_item.save()
+        menu_item = await aget_object_or_404(MenuItem, id=item_id)
+        cart_count = await get_cart(await request.auser()).aadd(menu_item)
         
         return JsonResponse({
             'success': True,
             'message': f'{menu_item.name} added to cart',
-            'cart_count': cart.cartitem_set.count()
+            'cart_count': cart_count
         })
     
     return JsonResponse({'success': False})
@@ -123,13 +116,8 @@ def cart_view(request):
     """
     Display user's cart
     """
-    try:
-        cart = Cart.objects.get(user=request.user)
-        cart_items = cart.cartitem_set.all()
-        total = cart.get_total()
-    except Cart.DoesNotExist:
-        cart_items = []
-        total = 0
+    cart_items = get_cart(request.user).lines()
+    total = sum(item.get_subtotal() for item in cart_items)
     
     return render(request, 'quickbites/cart.html', {
         'cart_items': cart_items,
@@ -141,7 +129,7 @@ def offers_view(request):
     """
     Display current offers
     """
-    offers = MenuItem.objects.filter(category='offer', is_available=True)
+    offers = get_menu_snapshot()['offers']
     return render(request, 'quickbites/offers.html', {'offers': offers})
 
 @login_required
@@ -172,21 +160,15 @@ def update_cart_item(request, item_id):
         quantity = int(data.get('quantity', 1))
         
         try:
-            cart = Cart.objects.get(user=request.user)
-            cart_item = CartItem.objects.get(cart=cart, id=item_id)
-            
-            if quantity > 0:
-                cart_item.quantity = quantity
-                cart_item.save()
-            else:
-                cart_item.delete()
+            cart_total, cart_count, item_subtotal = get_cart(request.user).set_quantity(item_id, quantity)
             
             return JsonResponse({
                 'success': True,
-                'cart_total': cart.get_total(),
-                'item_subtotal': cart_item.get_subtotal() if quantity > 0 else 0
+                'cart_total': cart_total,
+                'cart_count': cart_count,
+                'item_subtotal': item_subtotal
             })
-        except (Cart.DoesNotExist, CartItem.DoesNotExist):
+        except CartItem.DoesNotExist:
             return JsonResponse({'success': False})
     
     return JsonResponse({'success': False})
@@ -198,16 +180,15 @@ def remove_from_cart(request, item_id):
     """
     if request.method == 'POST':
         try:
-            cart = Cart.objects.get(user=request.user)
-            cart_item = CartItem.objects.get(cart=cart, id=item_id)
-            cart_item.delete()
+            cart_total, cart_count = get_cart(request.user).remove(item_id)
             
             return JsonResponse({
                 'success': True,
-                'cart_total': cart.get_total(),
+                'cart_total': cart_total,
+                'cart_count': cart_count,
                 'message': 'Item removed from cart'
             })
-        except (Cart.DoesNotExist, CartItem.DoesNotExist):
+        except CartItem.DoesNotExist:
             return JsonResponse({'success': False})
     
     return JsonResponse({'success': False})
@@ -217,18 +198,11 @@ def payment_view(request):
     """
     Mockup payment gateway
     """
-    try:
-        cart = Cart.objects.get(user=request.user)
-        cart_items = cart.cartitem_set.all()
-        total = cart.get_total()
-        
-        if not cart_items:
-            messages.error(request, 'Your cart is empty!')
-            return redirect('cart')
-            
-    except Cart.DoesNotExist:
+    cart_items = get_cart(request.user).lines()
+    if not cart_items:
         messages.error(request, 'Your cart is empty!')
         return redirect('cart')
+    total = sum(item.get_subtotal() for item in cart_items)
     
     return render(request, 'quickbites/payment.html', {
         'cart_items': cart_items,
@@ -242,42 +216,12 @@ def process_payment(request):
     """
     if request.method == 'POST':
         try:
-            cart = Cart.objects.get(user=request.user)
-            cart_items = cart.cartitem_set.all()
-            
-            if not cart_items:
-                messages.error(request, 'Your cart is empty!')
-                return redirect('cart')
-            
-            # Create order
-            order = Order.objects.create(
-                user=request.user,
-                total_amount=cart.get_total(),
-                status='confirmed'
-            )
-            
-            # Create order items
-            for cart_item in cart_items:
-                OrderItem.objects.create(
-                    order=order,
-                    menu_item=cart_item.menu_item,
-                    quantity=cart_item.quantity,
-                    price=cart_item.menu_item.price
-                )
-            
-            # Generate QR code for the order
-            qr_data = f"ORDER:{order.id}:{request.user.uprn}"
-            order.qr_code = generate_qr_code(qr_data)
-            order.save()
-            
-            # Clear cart
-            cart.delete()
-            
-            return redirect('payment_success', order_id=order.id)
-            
-        except Cart.DoesNotExist:
+            order = get_cart(request.user).checkout()
+        except EmptyCartError:
             messages.error(request, 'Your cart is empty!')
             return redirect('cart')
+        
+        return redirect('payment_success', order_id=order.id)
     
     return redirect('cart')
 
@@ -286,7 +230,7 @@ def payment_success(request, order_id):
     """
     Payment confirmation page
     """
-    order = get_object_or_404(Order, id=order_id, user=request.user)
+    order = get_object_or_404(Order.objects.defer('qr_code'), id=order_id, user=request.user)
     return render(request, 'quickbites/payment_success.html', {'order': order})
 
 @login_required
@@ -294,24 +238,107 @@ def profile_view(request):
     """
     User profile with order history and tickets
     """
-    orders = Order.objects.filter(user=request.user).order_by('-created_at')
-    return render(request, 'quickbites/profile.html', {'orders': orders})
+    orders, next_cursor = order_history_page(request.user, settings.PROFILE_ORDERS_PAGE_SIZE)
+    return render(request, 'quickbites/profile.html', {
+        'orders': orders,
+        'next_cursor': next_cursor
+    })
+
+@login_required
+def profile_orders(request):
+    """
+    JSON endpoint for the next page of order history (infinite scroll)
+    """
+    try:
+        orders, next_cursor = order_history_page(
+            request.user,
+            settings.PROFILE_ORDERS_PAGE_SIZE,
+            cursor=request.GET.get('cursor')
+        )
+    except InvalidCursor:
+        return JsonResponse({'success': False, 'message': 'Invalid cursor'}, status=400)
+    
+    return JsonResponse({
+        'success': True,
+        'orders': [
+            {
+                'id': str(order.id),
+                'total_amount': order.total_amount,
+                'is_redeemed': order.is_redeemed,
+                'created_at': date_format(timezone.localtime(order.created_at), 'M d, Y H:i'),
+                'item_count': order.item_count,
+                'ticket_url': reverse('ticket', args=[order.id]),
+            }
+            for order in orders
+        ],
+        'next_cursor': next_cursor
+    })
 
 @login_required
 def ticket_view(request, order_id):
     """
     Display digital ticket with QR code
     """
-    order = get_object_or_404(Order, id=order_id, user=request.user)
-    order_items = order.orderitem_set.all()
+    order = get_object_or_404(
+        Order.objects.defer('qr_code').select_related('user'),
+        id=order_id,
+        user=request.user
+    )
+    order_items = order.orderitem_set.select_related('menu_item')
     
-    return render(request, 'quickbites/ticket.html', {
+    context = {
         'order': order,
-        'order_items': order_items
-    })
+        'order_items': order_items,
+        'qr_format': settings.TICKET_QR_FORMAT,
+        'live_updates': serves_streams(request),
+    }
+    if settings.TICKET_QR_FORMAT == 'matrix':
+        # Small enough to send with the page, saving the image request
+        _, matrix = get_qr_image(order_qr_payload(order.id, order.user.uprn), 'matrix')
+        context.update({
+            'qr_matrix': base64.b64encode(matrix).decode(),
+            'qr_border': QR_BORDER,
+            'qr_box_size': QR_BOX_SIZE,
+        })
+    return render(request, 'quickbites/ticket.html', context)
+
+@login_required
+async def order_status_stream(request, order_id):
+    """
+    Server-sent event stream of one order's status for its ticket page.
+    Stays open only over ASGI; quickbites.asgi answers it without Django's
+    per-request thread (see quickbites/streaming.py).
+    """
+    try:
+        events = await order_status_events(await request.auser(), order_id, live=serves_streams(request))
+    except Order.DoesNotExist:
+        raise Http404('Order not found')
+    
+    return await event_stream_response(request, events)
+
+@login_required
+def ticket_qr_image(request, order_id, image_format='png'):
+    """
+    Serve the QR code image for a ticket, rendered on demand and cached
+    """
+    qr_data = order_qr_payload(order_id, request.user.uprn)
+    etag = f'"{qr_digest(qr_data, image_format)}"'
+    
+    # The image for a payload never changes, so a matching ETag is enough
+    if etag in request.headers.get('If-None-Match', ''):
+        response = HttpResponseNotModified()
+    else:
+        if not Order.objects.filter(id=order_id, user=request.user).exists():
+            raise Http404('Order not found')
+        _, image = get_qr_image(qr_data, image_format)
+        response = HttpResponse(image, content_type=QR_FORMATS[image_format][1])
+    
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, max-age=31536000, immutable'
+    return response
 
 @csrf_exempt
-def redeem_ticket(request):
+async def redeem_ticket(request):
     """
     API endpoint for redeeming tickets via QR scan
     """
@@ -320,44 +347,39 @@ def redeem_ticket(request):
             data = json.loads(request.body)
             qr_data = data.get('qr_data', '')
             
-            # Parse QR data: "ORDER:order_id:uprn"
-            if qr_data.startswith('ORDER:'):
-                parts = qr_data.split(':')
-                if len(parts) == 3:
-                    order_id = parts[1]
-                    uprn = parts[2]
-                    
-                    order = Order.objects.get(id=order_id, user__uprn=uprn)
-                    
-                    if order.is_redeemed:
-                        return JsonResponse({
-                            'success': False,
-                            'message': 'Ticket already redeemed'
-                        })
-                    
-                    # Mark as redeemed
-                    order.is_redeemed = True
-                    order.redeemed_at = timezone.now()
-                    order.status = 'completed'
-                    order.save()
-                    
-                    return JsonResponse({
-                        'success': True,
-                        'message': f'Order {order_id} redeemed successfully',
-                        'customer_name': order.user.name,
-                        'total_amount': str(order.total_amount)
-                    })
+            return JsonResponse(await services.aredeem_ticket(qr_data))
             
+        except Exception as e:
             return JsonResponse({
                 'success': False,
-                'message': 'Invalid QR code'
+                'message': 'Error processing request'
             })
+    
+    return JsonResponse({'success': False, 'message': 'Invalid request method'})
+
+@csrf_exempt
+def redeem_tickets(request):
+    """
+    API endpoint for redeeming a batch of buffered QR scans in one transaction
+    """
+    if request.method == 'POST':
+        try:
+            data = json.loads(request.body)
+            scans = data.get('scans')
+            
+            if not isinstance(scans, list) or not all(isinstance(scan, dict) for scan in scans):
+                return JsonResponse({'success': False, 'message': 'Invalid batch'})
+            if len(scans) > services.MAX_BATCH_SCANS:
+                return JsonResponse({
+                    'success': False,
+                    'message': f'Batch too large (max {services.MAX_BATCH_SCANS} scans)'
+                })
             
-        except Order.DoesNotExist:
             return JsonResponse({
-                'success': False,
-                'message': 'Order not found'
+                'success': True,
+                'results': services.redeem_tickets(scans)
             })
+            
         except Exception as e:
             return JsonResponse({
                 'success': False,
@@ -367,29 +389,107 @@ def redeem_ticket(request):
     return JsonResponse({'success': False, 'message': 'Invalid request method'})
 
 @login_required
-def get_cart_count(request):
+async def get_cart_count(request):
     """
     Get current cart item count
     """
-    try:
-        cart = Cart.objects.get(user=request.user)
-        count = cart.cartitem_set.count()
-    except Cart.DoesNotExist:
-        count = 0
+    count = await get_cart(await request.auser()).acount()
     
     return JsonResponse({'count': count})
 
-def generate_qr_code(data):
+@staff_member_required
+def kitchen_view(request):
+    """
+    Kitchen display of live orders, updated over server-sent events, or
+    reloaded every few seconds where streams cannot stay open
+    """
+    context = {
+        'statuses': [(status, label) for status, label in Order.STATUS_CHOICES if status in KITCHEN_STATUSES],
+        'live_updates': serves_streams(request),
+    }
+    if not context['live_updates']:
+        context.update({'snapshot': kitchen_snapshot(), 'reload_ms': SNAPSHOT_RETRY_MS})
+    return render(request, 'quickbites/kitchen.html', context)
+
+def serves_streams(request):
+    """
+    Whether an event stream can stay open for this request. Under WSGI
+    (runserver) an open stream holds one of the server's threads until the
+    client leaves, so pages poll instead.
+    """
+    return isinstance(request, ASGIRequest)
+
+async def event_stream_response(request, events):
     """
-    Generate QR code for order
+    Wrap a server-sent event generator in an unbuffered streaming response,
+    or read the finite one made for a WSGI request into a plain response
+    """
+    if serves_streams(request):
+        response = StreamingHttpResponse(events, content_type='text/event-stream')
+        # Stop reverse proxies from buffering the stream
+        response['X-Accel-Buffering'] = 'no'
+    else:
+        response = HttpResponse(''.join([message async for message in events]), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    return response
+
+@staff_member_required
+async def kitchen_stream(request):
+    """
+    Server-sent event stream of new and changed orders for kitchen displays.
+    Stays open only over ASGI; quickbites.asgi answers it without Django's
+    per-request thread (see quickbites/streaming.py).
+    """
+    events = await kitchen_events(await request.auser(), live=serves_streams(request))
+    return await event_stream_response(request, events)
+
+@staff_member_required
+def kitchen_update_status(request, order_id):
     """
-    qr = qrcode.QRCode(version=1, box_size=10, border=5)
-    qr.add_data(data)
-    qr.make(fit=True)
+    Move an order along the kitchen workflow from the kitchen display
+    """
+    if request.method == 'POST':
+        data = json.loads(request.body)
+        status = data.get('status')
+        if status not in dict(Order.STATUS_CHOICES):
+            return JsonResponse({'success': False, 'message': 'Invalid status'})
+        
+        order = get_object_or_404(Order.objects.defer('qr_code'), id=order_id)
+        order.status = status
+        # Saving sends post_save, which publishes the change to the streams
+        order.save(update_fields=['status'])
+        
+        return JsonResponse({'success': True, 'status': status})
     
-    img = qr.make_image(fill_color="black", back_color="white")
-    buffer = io.BytesIO()
-    img.save(buffer, format='PNG')
-    buffer.seek(0)
+    return JsonResponse({'success': False, 'message': 'Invalid request method'})
+
+def has_order_events_token(request):
+    token = settings.ORDER_EVENTS_TOKEN
+    authorization = request.headers.get('Authorization', '')
+    return bool(token) and constant_time_compare(authorization, f'Bearer {token}')
+
+@csrf_exempt
+def order_events(request):
+    """
+    API endpoint for the scanner to announce orders it changed, so they are
+    pushed to the live order streams served by this process. Callers send
+    ORDER_EVENTS_TOKEN as a bearer token.
+    """
+    if not has_order_events_token(request):
+        return HttpResponseForbidden()
     
-    return base64.b64encode(buffer.getvalue()).decode()
+    if request.method == 'POST':
+        try:
+            data = json.loads(request.body)
+            order_ids = [str(order_id) for order_id in data.get('order_ids', [])]
+            publish_orders(order_ids[:services.MAX_BATCH_SCANS])
+            
+            return JsonResponse({'success': True})
+            
+        except Exception as e:
+            return JsonResponse({
+                'success': False,
+                'message': 'Error processing request'
+            })
+    
+    return JsonResponse({'success': False, 'message': 'Invalid request method'})
@@ -1,8 +1,97 @@
 from django.shortcuts import render
 from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
+from django.conf import settings
 import json
+import logging
+import threading
+import time
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from asgiref.sync import sync_to_async
+from quickbites.metrics import REQUEST_ID_HEADER, current_request_id
+from quickbites.services import MAX_BATCH_SCANS, aredeem_ticket, redeem_tickets
+
+logger = logging.getLogger(__name__)
+
+_session = None
+_session_lock = threading.Lock()
+
+def get_redeem_session():
+    """
+    Shared keep-alive HTTP session for talking to the main app.
+    Only connection failures are retried: the request never reached the
+    server, so retrying cannot redeem a ticket twice.
+    """
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                retry = Retry(
+                    total=settings.SCANNER_REDEEM_RETRIES,
+                    connect=settings.SCANNER_REDEEM_RETRIES,
+                    read=0,
+                    status=0,
+                    backoff_factor=0.05,
+                )
+                adapter = HTTPAdapter(
+                    pool_connections=1,
+                    pool_maxsize=settings.SCANNER_REDEEM_POOL_SIZE,
+                    max_retries=retry,
+                )
+                session = requests.Session()
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                _session = session
+    return _session
+
+def upstream_headers():
+    """
+    Headers that tie a request to the main app to the scan that made it
+    """
+    request_id = current_request_id()
+    return {REQUEST_ID_HEADER: request_id} if request_id else {}
+
+def redeem_over_http(qr_data):
+    """
+    Redeem a ticket through the main app's redeem endpoint
+    """
+    response = get_redeem_session().post(
+        settings.SCANNER_REDEEM_URL,
+        json={'qr_data': qr_data},
+        headers=upstream_headers(),
+        timeout=(
+            settings.SCANNER_REDEEM_CONNECT_TIMEOUT,
+            settings.SCANNER_REDEEM_READ_TIMEOUT
+        )
+    )
+    return response.json()
+
+def redeem_batch_over_http(scans):
+    """
+    Redeem a batch of scans through the main app's batch endpoint
+    """
+    response = get_redeem_session().post(
+        settings.SCANNER_REDEEM_BATCH_URL,
+        json={'scans': scans},
+        headers=upstream_headers(),
+        timeout=(
+            settings.SCANNER_REDEEM_CONNECT_TIMEOUT,
+            settings.SCANNER_REDEEM_READ_TIMEOUT
+        )
+    )
+    return response.json()
+
+async def redeem(qr_data):
+    """
+    Redeem a ticket using the configured mode: 'direct' runs the shared
+    redemption service against the database, 'http' proxies to the main app
+    """
+    if settings.SCANNER_REDEEM_MODE == 'direct':
+        return await aredeem_ticket(qr_data)
+    # requests blocks, so proxied scans run on pool threads and overlap
+    return await sync_to_async(redeem_over_http, thread_sensitive=False)(qr_data)
 
 def scanner_view(request):
     """
@@ -12,28 +101,78 @@ def scanner_view(request):
     return render(request, 'scanner/scanner.html')
 
 @csrf_exempt
-def scan_ticket(request):
+async def scan_ticket(request):
     """
     Handle QR code scanning and ticket redemption
     """
     if request.method == 'POST':
+        start = time.perf_counter()
         try:
             data = json.loads(request.body)
             qr_data = data.get('qr_data', '')
             
-            # Make request to main app's redeem endpoint
-            response = requests.post(
-                'http://localhost:8000/api/redeem-ticket/',
-                json={'qr_data': qr_data},
-                headers={'Content-Type': 'application/json'}
+            result = await redeem(qr_data)
+            
+        except Exception as e:
+            logger.warning(
+                'Scan failed after %.1f ms: %s [request %s]',
+                (time.perf_counter() - start) * 1000, e, request.request_id
             )
+            return JsonResponse({
+                'success': False,
+                'message': 'Error processing scan'
+            })
+        
+        latency_ms = (time.perf_counter() - start) * 1000
+        logger.info(
+            'Scan (%s) redeemed=%s in %.1f ms [request %s]',
+            settings.SCANNER_REDEEM_MODE, result.get('success'), latency_ms, request.request_id
+        )
+        result['latency_ms'] = round(latency_ms, 1)
+        return JsonResponse(result)
+    
+    return JsonResponse({'success': False, 'message': 'Invalid request'})
+
+@csrf_exempt
+def scan_tickets(request):
+    """
+    Redeem a batch of scans queued by the scanner page while offline
+    """
+    if request.method == 'POST':
+        start = time.perf_counter()
+        try:
+            data = json.loads(request.body)
+            scans = data.get('scans')
+            
+            if not isinstance(scans, list) or not all(isinstance(scan, dict) for scan in scans):
+                return JsonResponse({'success': False, 'message': 'Invalid batch'})
+            if len(scans) > MAX_BATCH_SCANS:
+                return JsonResponse({
+                    'success': False,
+                    'message': f'Batch too large (max {MAX_BATCH_SCANS} scans)'
+                })
             
-            return JsonResponse(response.json())
+            if settings.SCANNER_REDEEM_MODE == 'direct':
+                result = {'success': True, 'results': redeem_tickets(scans)}
+            else:
+                result = redeem_batch_over_http(scans)
             
         except Exception as e:
+            logger.warning(
+                'Batch scan failed after %.1f ms: %s [request %s]',
+                (time.perf_counter() - start) * 1000, e, request.request_id
+            )
             return JsonResponse({
                 'success': False,
-                'message': 'Error processing scan'
+                'message': 'Error processing scans'
             })
+        
+        latency_ms = (time.perf_counter() - start) * 1000
+        logger.info(
+            'Batch of %d scans (%s) in %.1f ms [request %s]',
+            len(scans), settings.SCANNER_REDEEM_MODE, latency_ms, request.request_id
+        )
+        result['latency_ms'] = round(latency_ms, 1)
+        return JsonResponse(result)
     
     return JsonResponse({'success': False, 'message': 'Invalid request'})
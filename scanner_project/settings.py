@@ -1,6 +1,7 @@
 from pathlib import Path
 import os
 from dotenv import load_dotenv
+from quickbites.db_profiles import sqlite_options
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 load_dotenv(BASE_DIR / '.env')
@@ -17,10 +18,13 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'quickbites',
     'scanner',
 ]
 
 MIDDLEWARE = [
+    'quickbites.metrics.RequestMetricsMiddleware',
+    'quickbites.query_inspector.QueryInspectorMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -48,13 +52,69 @@ TEMPLATES = [
     },
 ]
 
+# Same SQLite profile as the main project; see quickbites/db_profiles.py
+QUICKBITES_DB_PROFILE = os.getenv('QUICKBITES_DB_PROFILE', 'default' if DEBUG else 'tuned')
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR.parent / 'db.sqlite3',  # Use main project database
+        'NAME': os.getenv('QUICKBITES_DB_PATH', BASE_DIR / 'db.sqlite3'),  # Use main project database
+        'OPTIONS': sqlite_options(QUICKBITES_DB_PROFILE),
     }
 }
 
+# Shared with the main project so the quickbites models can be used directly
+AUTH_USER_MODEL = 'quickbites.User'
+
+# How scans are redeemed: 'direct' calls the redemption service against the
+# shared database, 'http' proxies to the main app's redeem endpoint
+SCANNER_REDEEM_MODE = os.getenv('SCANNER_REDEEM_MODE', 'direct')
+
+# Main app redemption endpoint used by the scanner in 'http' mode
+SCANNER_REDEEM_URL = os.getenv('SCANNER_REDEEM_URL', 'http://localhost:8000/api/redeem-ticket/')
+SCANNER_REDEEM_BATCH_URL = os.getenv('SCANNER_REDEEM_BATCH_URL', 'http://localhost:8000/api/redeem-tickets/')
+SCANNER_REDEEM_CONNECT_TIMEOUT = float(os.getenv('SCANNER_REDEEM_CONNECT_TIMEOUT', '1.0'))
+SCANNER_REDEEM_READ_TIMEOUT = float(os.getenv('SCANNER_REDEEM_READ_TIMEOUT', '5.0'))
+SCANNER_REDEEM_RETRIES = int(os.getenv('SCANNER_REDEEM_RETRIES', '2'))
+SCANNER_REDEEM_POOL_SIZE = int(os.getenv('SCANNER_REDEEM_POOL_SIZE', '10'))
+
+# Direct redemptions happen in this process, which serves no order streams;
+# forward them to the main app so kitchen displays and tickets update live
+ORDER_EVENTS_QUEUE_SIZE = 100
+ORDER_EVENTS_KEEPALIVE = 15
+ORDER_EVENTS_FORWARD_URL = os.getenv('SCANNER_ORDER_EVENTS_URL', 'http://localhost:8000/api/order-events/')
+# Must match QUICKBITES_ORDER_EVENTS_TOKEN
+ORDER_EVENTS_TOKEN = os.getenv('SCANNER_ORDER_EVENTS_TOKEN')
+ORDER_EVENTS_BUS_DIR = None
+
+# Request metrics at /metrics/; see quickbites/settings.py
+METRICS_DIR = os.getenv('SCANNER_METRICS_DIR')
+METRICS_TOKEN = os.getenv('SCANNER_METRICS_TOKEN')
+
+# Query inspector; see quickbites/settings.py
+QUERY_INSPECTOR = os.getenv('SCANNER_QUERY_INSPECTOR', 'False') == 'True'
+SLOW_QUERY_MS = float(os.getenv('SCANNER_SLOW_QUERY_MS', '100'))
+N_PLUS_ONE_THRESHOLD = int(os.getenv('SCANNER_N_PLUS_ONE_THRESHOLD', '3'))
+# Batch scans are redeemed one by one, so scan_tickets has no fixed budget
+QUERY_BUDGETS = {
+    'scan_ticket': 2,
+}
+QUERY_BUDGET_STRICT = os.getenv('SCANNER_QUERY_BUDGET_STRICT', 'False') == 'True'
+
+# The scanner creates no orders, so has no tickets to pre-render
+QR_PRERENDER = False
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'scanner': {'handlers': ['console'], 'level': 'INFO'},
+    },
+}
+
 STATIC_URL = '/static/'
 STATICFILES_DIRS = [BASE_DIR / 'static']
 
@@ -1,9 +1,14 @@
 from django.contrib import admin
 from django.urls import path
+from quickbites.health import health_check
+from quickbites.metrics import metrics_view
 from scanner import views as scanner_views
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('scan-ticket/', scanner_views.scan_ticket, name='scan_ticket'),
+    path('scan-tickets/', scanner_views.scan_tickets, name='scan_tickets'),
+    path('healthz/', health_check, name='health_check'),
+    path('metrics/', metrics_view, name='metrics'),
     path('', scanner_views.scanner_view, name='home'),
 ]
\ No newline at end of file
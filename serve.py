@@ -0,0 +1,601 @@
+#!/usr/bin/env python
+"""
+Production launcher for QuickBites and the scanner.
+
+Each project gets a pre-fork master process. The master loads Django and
+the ASGI application once and binds the listening socket. It then forks
+the uvicorn workers, which share the loaded code copy-on-write and accept
+connections on the same socket. The master waits for every worker to report
+ready and replaces workers that die. This script starts the masters,
+watches each project's /healthz/ endpoint and starts a master again if it
+exits.
+
+Signals:
+    SIGHUP   graceful restart: workers are replaced one at a time
+    SIGTERM  graceful shutdown: in-flight requests finish, then exit
+    SIGINT   same as SIGTERM (Ctrl+C)
+    SIGUSR1  print each worker's memory use
+
+Workers restarted by SIGHUP run the code the master loaded; restart the
+launcher to deploy new code. Needs os.fork, so Unix only; use
+start_both_servers.py for local development on Windows.
+
+Usage: python serve.py --workers 4
+"""
+import argparse
+import gc
+import os
+import secrets
+import select
+import shutil
+import signal
+import socket
+import sys
+import tempfile
+import time
+import traceback
+import urllib.error
+import urllib.request
+from importlib import import_module
+
+import uvicorn
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Signals the launcher and the masters handle; children start from the defaults
+HANDLED_SIGNALS = (signal.SIGTERM, signal.SIGINT, signal.SIGHUP, signal.SIGUSR1, signal.SIGCHLD)
+
+
+def cpu_count():
+    """
+    CPUs this process may run on, which respects container CPU limits
+    """
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def memory_usage(pid):
+    """
+    (resident, proportional) set size of a process in MB, from /proc.
+    The proportional size divides pages shared copy-on-write between the
+    processes sharing them, so it shows what a worker adds on its own.
+    Either is None where the kernel does not report it.
+    """
+    fields = {}
+    for path in (f'/proc/{pid}/smaps_rollup', f'/proc/{pid}/status'):
+        try:
+            with open(path) as f:
+                for line in f:
+                    key, _, value = line.partition(':')
+                    fields.setdefault(key, value)
+        except OSError:
+            continue
+
+    def megabytes(key):
+        value = fields.get(key)
+        return int(value.split()[0]) / 1024 if value else None
+
+    return megabytes('Rss') or megabytes('VmRSS'), megabytes('Pss')
+
+
+def reset_signals():
+    signal.set_wakeup_fd(-1)
+    for signum in HANDLED_SIGNALS:
+        signal.signal(signum, signal.SIG_DFL)
+
+
+class WorkerServer(uvicorn.Server):
+    """
+    uvicorn server that tells the master once it is accepting connections
+    """
+
+    def __init__(self, config, ready_fd):
+        super().__init__(config)
+        self.ready_fd = ready_fd
+
+    async def startup(self, sockets=None):
+        await super().startup(sockets)
+        if self.started:
+            os.write(self.ready_fd, b'1')
+            os.close(self.ready_fd)
+
+
+class Worker:
+    def __init__(self, pid, ready_fd):
+        self.pid = pid
+        self.ready_fd = ready_fd
+        self.started_at = time.monotonic()
+        self.ready = False
+        # Set when the worker was asked to stop and must not be replaced
+        self.retiring = False
+
+    def close(self):
+        if self.ready_fd is not None:
+            os.close(self.ready_fd)
+            self.ready_fd = None
+
+
+class Arbiter:
+    """
+    Pre-fork master for one project. Runs in its own process, since Django
+    settings are global to a process.
+    """
+
+    # A worker that dies sooner than this after starting counts as a crash,
+    # and repeated crashes back off before the next restart
+    crash_window = 10
+    max_backoff = 30
+
+    def __init__(self, name, app, host, port, workers, graceful_timeout, ready_timeout):
+        self.name = name
+        self.app = app
+        self.host = host
+        self.port = port
+        self.size = workers
+        self.graceful_timeout = graceful_timeout
+        self.ready_timeout = ready_timeout
+        self.workers = {}
+        self.signals = []
+        self.stopping = False
+        self.crashes = 0
+        self.respawn_at = []
+
+    def log(self, message):
+        # One write, so lines from the two masters do not interleave
+        sys.stdout.write(f"[{self.name}] {message}\n")
+        sys.stdout.flush()
+
+    def run(self):
+        self.application = self.preload()
+        self.sock = self.bind()
+        self.install_signals()
+
+        for _ in range(self.size):
+            self.spawn()
+        if not self.wait_ready(list(self.workers.values()), self.ready_timeout):
+            self.log("workers did not become ready")
+            self.stop()
+            return 1
+        self.report()
+
+        while True:
+            self.reap()
+            while self.signals:
+                signum = self.signals.pop(0)
+                if signum in (signal.SIGTERM, signal.SIGINT):
+                    self.stop()
+                    return 0
+                if signum == signal.SIGHUP:
+                    self.reload()
+                elif signum == signal.SIGUSR1:
+                    self.report()
+            now = time.monotonic()
+            for due in [due for due in self.respawn_at if due <= now]:
+                self.respawn_at.remove(due)
+                self.spawn()
+            self.wait_for_events(timeout=1)
+
+    def preload(self):
+        """
+        Import Django and the application before forking, so workers share
+        the loaded modules instead of each importing its own copy
+        """
+        module, attribute = self.app.split(':')
+        application = getattr(import_module(module), attribute)
+
+        from django.db import connections
+        from django.urls import get_resolver
+
+        # Import the views and everything they import
+        get_resolver().url_patterns
+        # Connections must not be shared across fork
+        connections.close_all()
+        # Keep the preloaded objects out of the collector, which would
+        # otherwise write to their pages and unshare them in every worker
+        gc.collect()
+        gc.freeze()
+        return application
+
+    def bind(self):
+        family = socket.AF_INET6 if ':' in self.host else socket.AF_INET
+        return socket.create_server((self.host, self.port), family=family, backlog=2048)
+
+    def install_signals(self):
+        self.wake_r, self.wake_w = os.pipe()
+        os.set_blocking(self.wake_r, False)
+        os.set_blocking(self.wake_w, False)
+        signal.set_wakeup_fd(self.wake_w)
+        for signum in (signal.SIGTERM, signal.SIGINT, signal.SIGHUP, signal.SIGUSR1):
+            signal.signal(signum, lambda signum, frame: self.signals.append(signum))
+        # Only wakes the loop up to reap the worker
+        signal.signal(signal.SIGCHLD, lambda signum, frame: None)
+
+    def spawn(self):
+        ready_r, ready_w = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            code = 1
+            try:
+                os.close(ready_r)
+                self.serve(ready_w)
+                code = 0
+            except BaseException:
+                traceback.print_exc()
+            finally:
+                os._exit(code)
+        os.close(ready_w)
+        self.workers[pid] = Worker(pid, ready_r)
+        return self.workers[pid]
+
+    def serve(self, ready_fd):
+        """
+        Worker process: serve the preloaded application on the shared socket
+        """
+        reset_signals()
+        os.close(self.wake_r)
+        os.close(self.wake_w)
+        for worker in self.workers.values():
+            worker.close()
+
+        from django.db import connections
+
+        from quickbites.health import check_database
+
+        # Fail before reporting ready if the database is unreachable
+        check_database()
+        connections.close_all()
+
+        config = uvicorn.Config(
+            self.application,
+            lifespan='off',
+            access_log=False,
+            timeout_graceful_shutdown=self.graceful_timeout,
+        )
+        WorkerServer(config, ready_fd).run(sockets=[self.sock])
+
+    def wait_for_events(self, timeout):
+        """
+        Sleep until a signal arrives, a worker reports ready or timeout passes
+        """
+        pending = {worker.ready_fd: worker for worker in self.workers.values() if worker.ready_fd is not None}
+        readable, _, _ = select.select([self.wake_r, *pending], [], [], max(timeout, 0))
+        for fd in readable:
+            if fd == self.wake_r:
+                try:
+                    os.read(self.wake_r, 512)
+                except BlockingIOError:
+                    pass
+                continue
+            worker = pending[fd]
+            # An empty read means the worker exited before it was ready
+            worker.ready = os.read(fd, 1) == b'1'
+            worker.close()
+            if worker.ready:
+                self.crashes = 0
+
+    def wait_ready(self, workers, timeout):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if all(worker.ready for worker in workers):
+                return True
+            if any(worker.ready_fd is None and not worker.ready for worker in workers):
+                return False
+            self.wait_for_events(timeout=deadline - time.monotonic())
+        return False
+
+    def reap(self):
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            worker = self.workers.pop(pid, None)
+            if worker is None:
+                continue
+            worker.close()
+            if self.stopping or worker.retiring:
+                continue
+
+            code = os.waitstatus_to_exitcode(status)
+            if time.monotonic() - worker.started_at < self.crash_window:
+                self.crashes += 1
+            delay = min(2 ** self.crashes, self.max_backoff) if self.crashes > 1 else 0
+            self.log(f"worker {pid} exited with code {code}; restarting in {delay}s")
+            self.respawn_at.append(time.monotonic() + delay)
+
+    def reload(self):
+        """
+        Replace each worker once its replacement is ready, so the socket is
+        always being served
+        """
+        self.log("replacing workers")
+        for old in list(self.workers.values()):
+            if old.retiring:
+                continue
+            new = self.spawn()
+            if not self.wait_ready([new], self.ready_timeout):
+                self.log(f"replacement worker {new.pid} did not become ready; keeping {old.pid}")
+                continue
+            old.retiring = True
+            os.kill(old.pid, signal.SIGTERM)
+            self.reap()
+        self.report()
+
+    def stop(self):
+        self.stopping = True
+        self.log("finishing in-flight requests")
+        for pid in self.workers:
+            os.kill(pid, signal.SIGTERM)
+
+        deadline = time.monotonic() + self.graceful_timeout + 5
+        while self.workers and time.monotonic() < deadline:
+            self.reap()
+            time.sleep(0.1)
+        for pid in self.workers:
+            self.log(f"worker {pid} did not stop in time; killing it")
+            os.kill(pid, signal.SIGKILL)
+        while self.workers:
+            pid, _ = os.waitpid(-1, 0)
+            self.workers.pop(pid, None)
+        self.sock.close()
+
+    def report(self):
+        rss, _ = memory_usage(os.getpid())
+        lines = [f"master {os.getpid()}: {rss:.1f} MB RSS"]
+        for pid in sorted(self.workers):
+            rss, pss = memory_usage(pid)
+            if rss is None:
+                continue
+            line = f"worker {pid}: {rss:.1f} MB RSS"
+            if pss is not None:
+                line += f", {pss:.1f} MB PSS"
+            if self.workers[pid].retiring:
+                line += " (stopping)"
+            lines.append(line)
+        self.log("memory\n    " + "\n    ".join(lines))
+
+
+class Project:
+    """
+    One project served by an Arbiter in a forked process
+    """
+
+    def __init__(self, name, app, settings_module, host, port, workers, graceful_timeout, ready_timeout, env=None):
+        self.name = name
+        self.app = app
+        self.host = host
+        self.port = port
+        self.workers = workers
+        self.graceful_timeout = graceful_timeout
+        self.ready_timeout = ready_timeout
+        # An inherited DJANGO_SETTINGS_MODULE would point both projects at one settings file
+        self.env = dict(env or {}, DJANGO_SETTINGS_MODULE=settings_module)
+        self.pid = None
+        self.returncode = None
+        self.failures = 0
+
+    @property
+    def health_url(self):
+        host = '127.0.0.1' if self.host in ('0.0.0.0', '::') else self.host
+        return f'http://{host}:{self.port}/healthz/'
+
+    def start(self):
+        sys.stdout.flush()
+        pid = os.fork()
+        if pid == 0:
+            code = 1
+            try:
+                reset_signals()
+                os.environ.update(self.env)
+                sys.path.insert(0, BASE_DIR)
+                code = Arbiter(
+                    self.name, self.app, self.host, self.port,
+                    self.workers, self.graceful_timeout, self.ready_timeout,
+                ).run()
+            except BaseException:
+                traceback.print_exc()
+            finally:
+                sys.stdout.flush()
+                os._exit(code)
+        self.pid = pid
+        self.returncode = None
+        self.failures = 0
+        print(f"✅ {self.name} on http://{self.host}:{self.port} ({self.workers} workers, master pid {pid})")
+
+    def poll(self):
+        """
+        The master's exit code, or None while it runs
+        """
+        if self.returncode is None:
+            pid, status = os.waitpid(self.pid, os.WNOHANG)
+            if pid:
+                self.returncode = os.waitstatus_to_exitcode(status)
+        return self.returncode
+
+    def healthy(self, timeout=2):
+        try:
+            with urllib.request.urlopen(self.health_url, timeout=timeout) as response:
+                return response.status == 200
+        except (urllib.error.URLError, OSError):
+            return False
+
+    def wait_until_healthy(self, timeout):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.poll() is not None:
+                return False
+            if self.healthy():
+                return True
+            time.sleep(0.2)
+        return False
+
+    def signal(self, signum):
+        if self.poll() is None:
+            os.kill(self.pid, signum)
+
+    def wait(self, timeout):
+        deadline = time.monotonic() + timeout
+        while self.poll() is None and time.monotonic() < deadline:
+            time.sleep(0.1)
+        if self.poll() is None:
+            print(f"⚠️  {self.name} did not stop in {timeout}s; killing it")
+            os.kill(self.pid, signal.SIGKILL)
+            os.waitpid(self.pid, 0)
+
+
+def supervise(projects, health_interval, max_failures):
+    """
+    Health-check the projects until a shutdown signal arrives
+    """
+    stopping = False
+
+    def shutdown(signum, frame):
+        nonlocal stopping
+        stopping = True
+
+    def forward(signum, frame):
+        if signum == signal.SIGHUP:
+            print("🔄 Graceful restart requested")
+        for project in projects:
+            project.signal(signum)
+
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+    signal.signal(signal.SIGHUP, forward)
+    signal.signal(signal.SIGUSR1, forward)
+
+    while not stopping:
+        for project in projects:
+            if project.poll() is not None:
+                print(f"⚠️  {project.name} exited with code {project.returncode}; restarting")
+                project.start()
+            elif project.healthy():
+                project.failures = 0
+            else:
+                project.failures += 1
+                if project.failures >= max_failures:
+                    print(f"⚠️  {project.name} failed {project.failures} health checks; restarting workers")
+                    project.failures = 0
+                    project.signal(signal.SIGHUP)
+
+        deadline = time.monotonic() + health_interval
+        while not stopping and time.monotonic() < deadline:
+            time.sleep(0.1)
+
+    print("\nStopping servers (finishing in-flight requests)...")
+    for project in projects:
+        project.signal(signal.SIGTERM)
+    for project in projects:
+        project.wait(project.graceful_timeout + 10)
+    print("🛑 Servers stopped")
+
+
+def shared_cache_env(runtime_dir, workers):
+    """
+    Cache settings for QuickBites workers. Local memory is per process, so
+    with several workers and no cache configured they share a file-based
+    cache in runtime_dir instead; menu edits and carts then reach them all.
+    """
+    backend = os.getenv('QUICKBITES_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache')
+    env = {}
+    if workers > 1 and backend.endswith('.LocMemCache'):
+        if 'QUICKBITES_CACHE_BACKEND' in os.environ:
+            sys.exit("QUICKBITES_CACHE_BACKEND is local memory, which workers do not share; "
+                     "use a shared backend or --workers 1")
+        backend = 'django.core.cache.backends.filebased.FileBasedCache'
+        env = {
+            'QUICKBITES_CACHE_BACKEND': backend,
+            'QUICKBITES_CACHE_LOCATION': os.path.join(runtime_dir, 'cache'),
+        }
+    if (workers > 1 and backend.endswith('.FileBasedCache')
+            and os.getenv('QUICKBITES_CART_BACKEND', '').endswith('.CacheCart')):
+        print("⚠️  CacheCart needs a cache with an atomic add() across workers, e.g. Memcached or Redis; "
+              "the file-based cache can lose concurrent cart changes")
+    return env
+
+
+def main():
+    cpus = cpu_count()
+    parser = argparse.ArgumentParser(description='Run QuickBites and the scanner for production')
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=8000, help='QuickBites port')
+    parser.add_argument('--scanner-port', type=int, default=8001)
+    parser.add_argument('--workers', type=int, default=cpus, help='QuickBites worker processes (default: CPU count)')
+    parser.add_argument('--scanner-workers', type=int, default=max(1, cpus // 2),
+                        help='Scanner worker processes (default: half the CPU count)')
+    parser.add_argument('--health-interval', type=float, default=5.0, help='Seconds between health checks')
+    parser.add_argument('--health-failures', type=int, default=3, help='Failed checks before workers are restarted')
+    parser.add_argument('--graceful-timeout', type=int, default=30, help='Seconds to let requests finish on shutdown')
+    parser.add_argument('--ready-timeout', type=int, default=60, help='Seconds a worker may take to start')
+    args = parser.parse_args()
+
+    if not hasattr(os, 'fork'):
+        sys.exit("serve.py needs os.fork; use start_both_servers.py on this platform")
+
+    # Workers exchange live order events and share request metrics here
+    runtime_dir = tempfile.mkdtemp(prefix='quickbites-')
+    cache_env = shared_cache_env(runtime_dir, args.workers)
+    # The scanner announces the orders it redeems with this shared secret
+    order_events_token = os.getenv('QUICKBITES_ORDER_EVENTS_TOKEN') or secrets.token_urlsafe(32)
+    local_host = '127.0.0.1' if args.host in ('0.0.0.0', '::') else args.host
+
+    projects = [
+        Project(
+            'QuickBites', 'quickbites.asgi:application', 'quickbites.settings', args.host, args.port,
+            args.workers, args.graceful_timeout, args.ready_timeout,
+            env={
+                'QUICKBITES_EVENTS_BUS_DIR': os.path.join(runtime_dir, 'events'),
+                'QUICKBITES_METRICS_DIR': os.path.join(runtime_dir, 'metrics', 'quickbites'),
+                'QUICKBITES_ORDER_EVENTS_TOKEN': order_events_token,
+                # Each worker has its own CPU pool; together they get one process per CPU
+                'QUICKBITES_CPU_POOL_WORKERS': os.getenv('QUICKBITES_CPU_POOL_WORKERS', str(cpus // args.workers)),
+                **cache_env,
+            },
+        ),
+        Project(
+            'Scanner', 'scanner_project.asgi:application', 'scanner_project.settings', args.host, args.scanner_port,
+            args.scanner_workers, args.graceful_timeout, args.ready_timeout,
+            env={
+                'SCANNER_METRICS_DIR': os.path.join(runtime_dir, 'metrics', 'scanner'),
+                'SCANNER_REDEEM_URL': os.getenv(
+                    'SCANNER_REDEEM_URL', f'http://{local_host}:{args.port}/api/redeem-ticket/'
+                ),
+                'SCANNER_REDEEM_BATCH_URL': os.getenv(
+                    'SCANNER_REDEEM_BATCH_URL', f'http://{local_host}:{args.port}/api/redeem-tickets/'
+                ),
+                'SCANNER_ORDER_EVENTS_URL': os.getenv(
+                    'SCANNER_ORDER_EVENTS_URL', f'http://{local_host}:{args.port}/api/order-events/'
+                ),
+                'SCANNER_ORDER_EVENTS_TOKEN': os.getenv('SCANNER_ORDER_EVENTS_TOKEN', order_events_token),
+            },
+        ),
+    ]
+
+    print("--- Starting Canteen Digitalization Project ---")
+    for project in projects:
+        project.start()
+    for project in projects:
+        if not project.wait_until_healthy(timeout=args.ready_timeout):
+            print(f"❌ {project.name} did not become healthy")
+            for other in projects:
+                other.signal(signal.SIGTERM)
+            for other in projects:
+                other.wait(args.graceful_timeout + 10)
+            shutil.rmtree(runtime_dir, ignore_errors=True)
+            sys.exit(1)
+    print("-" * 48)
+    print("🔄 kill -HUP to restart workers, kill -USR1 for memory use, Ctrl+C to stop.")
+    print("-" * 48)
+
+    try:
+        supervise(projects, args.health_interval, args.health_failures)
+    finally:
+        shutil.rmtree(runtime_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
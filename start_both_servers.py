@@ -1,6 +1,7 @@
 import subprocess
 import time
 import os
+import secrets
 import sys
 
 # --- Configuration ---
@@ -53,6 +54,11 @@ def start_servers():
         "--settings=scanner_project.settings" # Specify settings file
     ]
 
+    # The scanner announces the orders it redeems to QuickBites with a shared secret
+    token = os.environ.get("QUICKBITES_ORDER_EVENTS_TOKEN") or secrets.token_urlsafe(32)
+    os.environ.setdefault("QUICKBITES_ORDER_EVENTS_TOKEN", token)
+    os.environ.setdefault("SCANNER_ORDER_EVENTS_TOKEN", token)
+
     # Start both processes
     processes = [
         subprocess.Popen(quickbites_command),